@@ -0,0 +1,230 @@
+"""
+Microbenchmarks for the hot functions on the /chat path.
+
+Each benchmark calls one function with varied, realistic inputs and
+reports per-call latency percentiles and calls per second. Run from the
+repo root:
+
+    python scripts/bench.py                    # data/ as it is
+    python scripts/bench.py --scale 10         # 10x dataset (generated once)
+    python scripts/bench.py --rag --json out.json
+
+Datasets for --scale N are written by scripts/generate_data.py to
+data/bench-xN/ and reused afterwards.
+"""
+import argparse
+import copy
+import json
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Sequence
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.config import load_config  # noqa: E402
+
+MESSAGES = [
+    "I'm cold, what should I get?",
+    "Where is the nearest open store?",
+    "Do I have any coupons left?",
+    "Is my last order ready? Call me at 987-654-3210.",
+    "Can you email the receipt to priya.sharma@example.com?",
+    "What did I order last time?",
+    "Recommend something sweet under 5 dollars",
+    "Are you open late tonight?",
+]
+
+
+# --------------------------------------------------------------
+# DATASETS AND CONFIG
+# --------------------------------------------------------------
+def dataset_dir(scale: int) -> Path:
+    """
+    Directory holding the CSVs for a data scale, generating them if missing.
+    """
+    out_dir = ROOT / "data" if scale == 1 else ROOT / "data" / f"bench-x{scale}"
+    if not (out_dir / "coupons.csv").exists():
+        print(f"Generating {scale}x dataset in {out_dir} ...", file=sys.stderr)
+        subprocess.run(
+            [sys.executable, str(ROOT / "scripts" / "generate_data.py"), "--scale", str(scale), "--out-dir", str(out_dir)],
+            check=True,
+        )
+    return out_dir
+
+
+def bench_config(data_dir: Path, rag: bool = False) -> Dict[str, Any]:
+    """
+    config.yaml pointed at data_dir, with the stub LLM and eager startup.
+    """
+    cfg = copy.deepcopy(load_config(ROOT / "config.yaml"))
+    cfg["data"] = {
+        **cfg.get("data", {}),
+        **{name: str(data_dir / f"{name}.csv") for name in ("customers", "orders", "stores", "coupons")},
+        "snapshot_dir": str(data_dir / ".snapshot"),
+    }
+    cfg["llm"] = {**cfg.get("llm", {}), "provider": "stub"}
+    cfg["startup"] = {"mode": "eager"}
+    cfg["ingest"] = {"watch": False}
+    cfg["rag"] = {**cfg.get("rag", {}), "enabled": rag, "docs_path": str(ROOT / cfg.get("rag", {}).get("docs_path", "docs"))}
+    return cfg
+
+
+# --------------------------------------------------------------
+# MEASUREMENT
+# --------------------------------------------------------------
+def summarize(latencies_ms: Sequence[float], elapsed_s: float | None = None) -> Dict[str, float]:
+    """
+    p50/p95/p99/mean latency (ms) and throughput of a list of timings.
+    """
+    values = np.asarray(latencies_ms, dtype="float64")
+    if not len(values):
+        return {"count": 0}
+    if elapsed_s is None:
+        elapsed_s = values.sum() / 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {
+        "count": int(len(values)),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "p99_ms": round(float(p99), 4),
+        "mean_ms": round(float(values.mean()), 4),
+        "per_s": round(len(values) / elapsed_s, 1) if elapsed_s else 0.0,
+    }
+
+
+def measure(fn: Callable[..., Any], inputs: List[tuple], iterations: int, max_seconds: float) -> Dict[str, float]:
+    """
+    Call fn(*args) cycling over inputs, up to ``iterations`` calls or ``max_seconds``.
+    """
+    for args in inputs[:5]:  # warm-up: lazy imports, first-touch caches
+        fn(*args)
+
+    latencies: List[float] = []
+    deadline = time.perf_counter() + max_seconds
+    for i in range(iterations):
+        args = inputs[i % len(inputs)]
+        start = time.perf_counter()
+        fn(*args)
+        latencies.append((time.perf_counter() - start) * 1000)
+        if time.perf_counter() > deadline:
+            break
+    return summarize(latencies)
+
+
+def print_table(title: str, results: Dict[str, Dict[str, float]]) -> None:
+    print(f"\n{title}")
+    print(f"{'benchmark':<44}{'calls':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'calls/s':>12}")
+    for name, r in results.items():
+        if not r.get("count"):
+            print(f"{name:<44}{'skipped':>8}")
+            continue
+        print(
+            f"{name:<44}{r['count']:>8}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}"
+            f"{r['p99_ms']:>10.3f}{r['per_s']:>12.1f}"
+        )
+
+
+# --------------------------------------------------------------
+# BENCHMARKS
+# --------------------------------------------------------------
+def run(cfg: Dict[str, Any], iterations: int, max_seconds: float, rag: bool, seed: int) -> Dict[str, Dict[str, float]]:
+    from src import data_loader, geo
+    from src.llm_orchestrator import build_prompt
+    from src.privacy import mask_text
+
+    rng = random.Random(seed)
+    customers, orders, stores, coupons = data_loader.load_all_data(cfg)
+    customer_index = data_loader.CustomerIndex(customers, orders, coupons)
+    store_index = geo.StoreIndex(stores)
+
+    user_ids = rng.sample(list(customers["customer_id"]), min(1000, len(customers)))
+    lats = customers["lat"].to_numpy()
+    lons = customers["lon"].to_numpy()
+    points = [(float(lats[i]), float(lons[i])) for i in rng.sample(range(len(customers)), min(1000, len(customers)))]
+    now = datetime.now()
+
+    results: Dict[str, Dict[str, float]] = {}
+
+    def bench(name: str, fn: Callable[..., Any], inputs: List[tuple]) -> None:
+        results[name] = measure(fn, inputs, iterations, max_seconds)
+
+    bench("get_recent_orders (DataFrame)", data_loader.get_recent_orders, [(orders, u) for u in user_ids])
+    bench("CustomerIndex.get_recent_orders", customer_index.get_recent_orders, [(u,) for u in user_ids])
+    bench(
+        "find_nearest_open_store (DataFrame)",
+        geo.find_nearest_open_store,
+        [(stores, lat, lon, now.hour) for lat, lon in points],
+    )
+    bench(
+        "StoreIndex.nearest_open_store",
+        store_index.nearest_open_store,
+        [(lat, lon, now.hour, now.weekday()) for lat, lon in points],
+    )
+    bench("mask_text", mask_text, [(m,) for m in MESSAGES])
+
+    contexts = []
+    for u, (lat, lon) in zip(user_ids[:200], points):
+        contexts.append({
+            "customer": customer_index.get_customer(u),
+            "recent_orders": customer_index.get_recent_orders(u),
+            "coupons": customer_index.get_active_coupons(u),
+            "store": store_index.nearest_open_store(lat, lon, now.hour, now.weekday()),
+        })
+    snippets = ["Coupons cannot be combined with other offers.", "Stores open between 7 and 10 AM."]
+    bench(
+        "build_prompt",
+        build_prompt,
+        [(c, rng.choice(MESSAGES), snippets, cfg.get("prompt"), cfg.get("privacy")) for c in contexts],
+    )
+
+    results["RAGIndex.retrieve (uncached)"] = {"count": 0}
+    if rag:
+        from src.rag import RAGIndex
+
+        rag_cfg = cfg["rag"]
+        index_cfg = dict(rag_cfg.get("index", {}))
+        rag_index = RAGIndex(
+            rag_cfg["docs_path"],
+            model_name=rag_cfg.get("model", "all-MiniLM-L6-v2"),
+            cache_dir=rag_cfg.get("cache_dir"),
+            query_cache_size=0,  # measure the encode + search path, not the query cache
+            index_type=index_cfg.pop("type", "flat_l2"),
+            index_params=index_cfg,
+            retriever=rag_cfg.get("retriever", "dense"),
+            bm25_params=rag_cfg.get("bm25"),
+        )
+        rag_index.build()
+        if rag_index.chunks:
+            top_k = rag_cfg.get("top_k", 3)
+            bench("RAGIndex.retrieve (uncached)", rag_index.retrieve, [(m, top_k) for m in MESSAGES])
+
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1, help="data scale: 1 uses data/, N uses a generated Nx dataset")
+    parser.add_argument("--iterations", type=int, default=2000, help="max calls per benchmark")
+    parser.add_argument("--max-seconds", type=float, default=5.0, help="time budget per benchmark")
+    parser.add_argument("--rag", action="store_true", help="also benchmark RAGIndex.retrieve")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    data_dir = dataset_dir(args.scale)
+    results = run(bench_config(data_dir, rag=args.rag), args.iterations, args.max_seconds, args.rag, args.seed)
+    print_table(f"Microbenchmarks ({args.scale}x data, {data_dir})", results)
+
+    if args.json:
+        args.json.write_text(json.dumps({"scale": args.scale, "results": results}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
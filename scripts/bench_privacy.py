@@ -0,0 +1,123 @@
+"""
+Throughput benchmark for the PII masker.
+
+Compares the single-pass masker against the old two-pass phone/email
+masker (copied verbatim) on realistic chat messages, long documents,
+PII-free prose and adversarial inputs (long runs that almost match). Run from the repo root:
+
+    python scripts/bench_privacy.py [--repeat 5]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src.privacy import get_masker  # noqa: E402
+
+# --------------------------------------------------------------
+# LEGACY TWO-PASS MASKER (baseline)
+# --------------------------------------------------------------
+# Verbatim from the pre-engine src/privacy.py.
+_LEGACY_PHONE = re.compile(r"\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b")
+_LEGACY_EMAIL = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+
+
+def _legacy_mask_phone(match: re.Match) -> str:
+    number = match.group()
+    return "***-***-" + number[-4:]
+
+
+def _legacy_mask_email(match: re.Match) -> str:
+    email = match.group()
+    local, _, domain = email.partition("@")
+    if len(local) <= 2:
+        masked_local = "*" * len(local)
+    else:
+        masked_local = local[0] + "***" + local[-1]
+    return f"{masked_local}@{domain}"
+
+
+def legacy_mask(text: str) -> str:
+    text = _LEGACY_PHONE.sub(_legacy_mask_phone, text)
+    text = _LEGACY_EMAIL.sub(_legacy_mask_email, text)
+    return text
+
+
+# --------------------------------------------------------------
+# INPUTS
+# --------------------------------------------------------------
+PROSE = (
+    "Our stores open at seven and close late on weekends. Ask the barista about "
+    "seasonal drinks, oat milk and the loyalty programme; Gold members get a free "
+    "upgrade on their third visit of the week. "
+)
+
+
+def chat_messages(n: int, rng: random.Random) -> list:
+    templates = [
+        "Where is my order? You can call me on {phone}.",
+        "Please send the invoice to {email}, thanks!",
+        "Is the store near 12.971623, 77.594612 open right now?",
+        "Any coupons for me today?",
+        "My number changed to {phone} and my email is {email}.",
+    ]
+    messages = []
+    for _ in range(n):
+        phone = f"{rng.randint(600, 999)}-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}"
+        email = f"user{rng.randint(1, 10**6)}@example.com"
+        messages.append(rng.choice(templates).format(phone=phone, email=email))
+    return messages
+
+
+def inputs(rng: random.Random) -> dict:
+    messages = chat_messages(2000, rng)
+    return {
+        "chat (2000 messages)": messages,
+        "long document (1 MB)": [" ".join(messages) * (1_000_000 // len(" ".join(messages)) + 1)],
+        "prose, no PII (1 MB)": [PROSE * (1_000_000 // len(PROSE) + 1)],
+        "adversarial: 20k word chars, no @": ["a" * 20_000],
+        "adversarial: 20k digits": ["1" * 20_000],
+        "adversarial: dotted run": ["a." * 10_000 + "@"],
+    }
+
+
+# --------------------------------------------------------------
+# BENCHMARK
+# --------------------------------------------------------------
+def bench(fn, texts: list, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(texts)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="runs per case (best is reported)")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    masker = get_masker()
+    runners = {
+        "legacy two-pass": lambda texts: [legacy_mask(t) for t in texts],
+        "mask_text": lambda texts: [masker.mask_text(t) for t in texts],
+        "mask_many": masker.mask_many,
+    }
+
+    print(f"{'input':<38}{'masker':<18}{'seconds':>10}{'MB/s':>10}")
+    for name, texts in inputs(random.Random(args.seed)).items():
+        size_mb = sum(len(t) for t in texts) / 1e6
+        for runner_name, fn in runners.items():
+            seconds = bench(fn, texts, args.repeat)
+            print(f"{name:<38}{runner_name:<18}{seconds:>10.4f}{size_mb / seconds:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Recall-vs-latency sweep for the RAG index types.
+
+Builds every index type in src.rag.INDEX_TYPES over the same vectors and
+measures recall@k against exact flat search, per-query latency and index
+size, sweeping nprobe (IVF) and ef_search (HNSW). Run from the repo root:
+
+    python scripts/bench_rag_index.py --synthetic 200000     # random clustered vectors, no model
+    python scripts/bench_rag_index.py                        # docs/ with the configured model
+
+Synthetic vectors stand in for a large knowledge base: the docs/ corpus
+is only a few chunks, where every index type is exact.
+"""
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from src import rag  # noqa: E402
+from src.config import load_config  # noqa: E402
+
+
+def sweep_for(index_type: str, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    if index_type.startswith("ivf"):
+        return [{"nprobe": n} for n in args.nprobe]
+    if index_type == "hnsw":
+        return [{"ef_search": ef} for ef in args.ef_search]
+    return [{}]
+
+
+def add_rows(
+    rows: List[Dict[str, Any]], index_type: str, evaluation: List[Dict[str, Any]], build_s: float, size_mb: float
+) -> None:
+    """
+    Append one index's evaluation rows, keeping a single exact baseline row.
+    """
+    for row in evaluation:
+        if row["index"] == "exact":
+            if not rows:
+                rows.append({**row, "index": "exact (flat)", "build_s": None, "size_mb": None})
+            continue
+        rows.append({**row, "index": index_type, "build_s": round(build_s, 3), "size_mb": round(size_mb, 1)})
+
+
+def clustered_vectors(n: int, dim: int, clusters: int, rng: np.random.Generator, latent_dim: int = 32) -> np.ndarray:
+    """
+    Unit vectors around topic centroids in a low-dimensional subspace, like sentence embeddings.
+    """
+    centroids = rng.standard_normal((clusters, latent_dim), dtype="float32")
+    latent = centroids[rng.integers(clusters, size=n)] + 0.5 * rng.standard_normal((n, latent_dim), dtype="float32")
+    projection = rng.standard_normal((latent_dim, dim), dtype="float32")
+    vectors = latent @ projection + 0.05 * rng.standard_normal((n, dim), dtype="float32") * np.sqrt(latent_dim)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+
+def run_synthetic(args: argparse.Namespace, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    if not rag._import_faiss():
+        sys.exit("faiss-cpu is not installed")
+    rng = np.random.default_rng(args.seed)
+    clusters = max(1, args.synthetic // 500)
+    data = clustered_vectors(args.synthetic + args.queries, args.dim, clusters, rng)
+    base, queries = data[: args.synthetic], data[args.synthetic :]
+
+    rows: List[Dict[str, Any]] = []
+    for index_type in args.types:
+        started = time.perf_counter()
+        index = rag.build_faiss_index(base, index_type, params)
+        build_s = time.perf_counter() - started
+        size_mb = rag.faiss.serialize_index(index).nbytes / 1e6
+        evaluation = rag.evaluate_index(index, base, queries, args.top_k, sweep_for(index_type, args))
+        add_rows(rows, index_type, evaluation, build_s, size_mb)
+    return rows
+
+
+def run_docs(args: argparse.Namespace, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    cfg = load_config(ROOT / "config.yaml")
+    rag_cfg = cfg.get("rag", {})
+    rows: List[Dict[str, Any]] = []
+    for index_type in args.types:
+        rag_index = rag.RAGIndex(
+            str(ROOT / rag_cfg.get("docs_path", "docs")),
+            model_name=rag_cfg.get("model", "all-MiniLM-L6-v2"),
+            cache_dir=str(ROOT / rag_cfg["cache_dir"]) if rag_cfg.get("cache_dir") else None,
+            index_type=index_type,
+            index_params=params,
+        )
+        started = time.perf_counter()
+        rag_index.build()
+        build_s = time.perf_counter() - started
+        if rag_index.index is None:
+            sys.exit("RAG index could not be built (missing libraries or documents)")
+        size_mb = rag.faiss.serialize_index(rag_index.index).nbytes / 1e6
+        evaluation = rag_index.evaluate(args.top_k, args.queries, sweep=sweep_for(index_type, args), seed=args.seed)
+        add_rows(rows, index_type, evaluation, build_s, size_mb)
+    return rows
+
+
+def print_rows(title: str, rows: List[Dict[str, Any]], top_k: int) -> None:
+    print(f"\n{title}")
+    print(f"{'index':<14}{'params':<18}{f'recall@{top_k}':>10}{'p50 ms':>10}{'p95 ms':>10}{'qps':>10}{'build s':>10}{'MB':>8}")
+    for r in rows:
+        params = ",".join(f"{k}={v}" for k, v in r["params"].items()) or "-"
+        build = f"{r['build_s']:>10.3f}" if r["build_s"] is not None else f"{'-':>10}"
+        size = f"{r['size_mb']:>8.1f}" if r["size_mb"] is not None else f"{'-':>8}"
+        print(
+            f"{r['index']:<14}{params:<18}{r['recall']:>10.3f}{r['p50_ms']:>10.3f}{r['p95_ms']:>10.3f}"
+            f"{r['qps']:>10.1f}{build}{size}"
+        )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--synthetic", type=int, default=0, help="index N random clustered vectors instead of docs/")
+    parser.add_argument("--dim", type=int, default=384, help="synthetic vector dimension (MiniLM: 384)")
+    parser.add_argument("--types", nargs="+", default=list(rag.INDEX_TYPES), choices=rag.INDEX_TYPES)
+    parser.add_argument("--queries", type=int, default=500, help="queries per setting")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nprobe", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[16, 32, 64, 128])
+    parser.add_argument("--params", type=json.loads, default={}, help='build parameters as JSON, e.g. \'{"nlist": 1024}\'')
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        rows = run_synthetic(args, args.params)
+        title = f"RAG index sweep ({args.synthetic:,} synthetic vectors, dim {args.dim})"
+    else:
+        rows = run_docs(args, args.params)
+        title = "RAG index sweep (docs/)"
+    print_rows(title, rows, args.top_k)
+
+    if args.json:
+        args.json.write_text(json.dumps(rows, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,29 @@
-import csv
-import random
+"""
+Generate synthetic PulseCX data: stores, customers, orders and coupons.
+
+Every table is built with vectorized NumPy in fixed-size chunks and
+streamed to disk, so memory stays flat and 100M orders take minutes. The
+output is fully determined by --seed; --chunk-size does not change it.
+
+    python scripts/generate_data.py                         # default sizes, CSV in data/
+    python scripts/generate_data.py --scale 100             # 100x every table
+    python scripts/generate_data.py --orders 100000000 --customers 5000000 --format arrow
+    python scripts/generate_data.py --city-skew 1.2 --orders-dist zipf --orders-skew 1.1
+
+--format arrow writes uncompressed Arrow IPC files (<table>.arrow) that
+the loader memory-maps directly; point data.* in config.yaml at them.
+"""
+import argparse
+import time
 from pathlib import Path
-from datetime import datetime, timedelta
 
 import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
 
 ROOT = Path(__file__).resolve().parents[1]
 DATA_DIR = ROOT / "data"
-DATA_DIR.mkdir(exist_ok=True)
 
 # --------------------------------------------------------------
 # CITY COORDINATES (REAL LOCATIONS)
@@ -24,223 +40,344 @@ CITY_COORDS = {
     "Ahmedabad": (23.0225, 72.5714),
     "Kochi": (9.9312, 76.2673),
 }
+CITIES = list(CITY_COORDS)
+CITY_LATS = np.array([CITY_COORDS[c][0] for c in CITIES])
+CITY_LONS = np.array([CITY_COORDS[c][1] for c in CITIES])
+
+FIRST_NAMES = [
+    "Alex", "Blake", "Chitra", "Dev", "Esha", "Farhan", "Gia", "Hari",
+    "Isha", "Kabir", "Lena", "Mira", "Nikhil", "Om", "Priya", "Rohan",
+    "Sara", "Tanvi", "Uma", "Vikram",
+]
+LAST_NAMES = ["Sharma", "Patel", "Rao", "Iyer", "Khan", "Singh", "Nair", "Das", "Mehta", "Kulkarni"]
+TIERS, TIER_P = ["Bronze", "Silver", "Gold", "Platinum"], [0.5, 0.3, 0.15, 0.05]
+DRINKS = ["Latte", "Cappuccino", "Espresso", "Hot Cocoa", "Cold Brew", "Mocha"]
+STATUSES, STATUS_P = ["placed", "preparing", "ready", "delivered"], [0.1, 0.2, 0.2, 0.5]
+QUANTITY_P = [0.7, 0.2, 0.1]
+DISCOUNTS, DISCOUNT_P = [5, 10, 15, 20], [0.4, 0.3, 0.2, 0.1]
+COUPONS_PER_CUSTOMER_P = [0.5, 0.3, 0.15, 0.05]
+
+ORDERS_START = np.datetime64("2025-01-01T00:00:00", "s")
+COUPONS_START = np.datetime64("2025-06-01", "D")
 
 
 # --------------------------------------------------------------
-# 1. STORES
+# HELPERS
 # --------------------------------------------------------------
-def generate_stores(n_stores: int = 50):
-    rows = []
-
-    for i in range(1, n_stores + 1):
-        city = random.choice(list(CITY_COORDS.keys()))
-        base_lat, base_lon = CITY_COORDS[city]
-
-        # store location within 1–2 km of center
-        lat = round(base_lat + random.uniform(-0.02, 0.02), 6)
-        lon = round(base_lon + random.uniform(-0.02, 0.02), 6)
-
-        open_hour = random.choice(range(7, 10))
-        close_hour = random.choice(range(20, 24))
-
-        rows.append({
-            "store_id": f"store_{i:03d}",
-            "name": f"{city} Coffee #{i}",
-            "city": city,
-            "lat": lat,
-            "lon": lon,
-            "open_hour": open_hour,
-            "close_hour": close_hour,
-        })
-
-    path = DATA_DIR / "stores.csv"
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "store_id", "name", "city",
-                "lat", "lon", "open_hour", "close_hour"
-            ]
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+class TableWriter:
+    """
+    Stream chunks of one table to <out_dir>/<name>.csv or <name>.arrow.
+
+    Columns built with categorical() are the ones the loader reads as
+    categoricals; Arrow files keep them dictionary-encoded, CSV gets the
+    plain strings. The file is renamed into place once complete.
+    """
+
+    def __init__(self, out_dir: Path, name: str, fmt: str) -> None:
+        self.path = out_dir / f"{name}.{fmt}"
+        self.tmp_path = out_dir / f"{name}.{fmt}.tmp"
+        self.fmt = fmt
+        self.rows = 0
+        self._writer = None
+        self._sink = None
+
+    def write(self, columns: dict) -> None:
+        if self.fmt == "csv":
+            columns = {
+                name: values.dictionary_decode() if isinstance(values, pa.DictionaryArray) else values
+                for name, values in columns.items()
+            }
+        table = pa.table(columns)
+        if self._writer is None:
+            if self.fmt == "arrow":
+                self._writer = pa.ipc.new_file(str(self.tmp_path), table.schema)
+            else:
+                # Values come from fixed vocabularies (no commas or quotes), so no quoting.
+                # Arrow always quotes the header, so it is written here, plain.
+                self._sink = pa.OSFile(str(self.tmp_path), "wb")
+                self._sink.write((",".join(table.column_names) + "\n").encode("utf-8"))
+                options = pa_csv.WriteOptions(include_header=False, quoting_style="none")
+                self._writer = pa_csv.CSVWriter(self._sink, table.schema, write_options=options)
+        self._writer.write_table(table)
+        self.rows += len(table)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            if self._sink is not None:
+                self._sink.close()
+            self.tmp_path.replace(self.path)
+        print(f"  {self.path}: {self.rows:,} rows")
+
+
+def city_weights(skew: float) -> np.ndarray:
+    """
+    Zipf-like city popularity: weight ∝ 1 / rank**skew (0 = uniform).
+    """
+    weights = 1.0 / np.arange(1, len(CITIES) + 1) ** skew
+    return weights / weights.sum()
+
+
+def ids(prefix: str, numbers: np.ndarray, width: int) -> pa.Array:
+    """
+    prefix + zero-padded numbers, e.g. cust_00001.
+    """
+    digits = pc.cast(pa.array(numbers), pa.string())
+    return pc.binary_join_element_wise(prefix, pc.utf8_lpad(digits, width, "0"), "")
+
+
+def categorical(codes: np.ndarray, values: list) -> pa.DictionaryArray:
+    return pa.DictionaryArray.from_arrays(pa.array(codes.astype("int32")), pa.array(values))
+
+
+def column_rngs(rng: np.random.Generator, names: list) -> dict:
+    """
+    One independent stream per column, spawned from the table's stream.
+
+    Each stream is consumed in row order, so a column's values depend only
+    on the row number and not on how the rows are split into chunks.
+    """
+    return dict(zip(names, rng.spawn(len(names))))
+
+
+def randint(rng: np.random.Generator, low: int, high: int, n: int) -> np.ndarray:
+    """
+    Integers in [low, high), one double per value. Unlike rng.integers,
+    whose small-range draws are buffered per call, the values do not
+    depend on how the draws are split across calls.
+    """
+    return low + (rng.random(n) * (high - low)).astype("int64")
+
+
+def chunks(n: int, chunk_size: int):
+    for start in range(0, n, chunk_size):
+        yield start, min(chunk_size, n - start)
+
+
+def customer_weights(n_customers: int, dist: str, skew: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Share of all orders placed by each customer.
+
+    uniform: every customer equally likely (counts are ~Poisson);
+    zipf: weight ∝ 1 / rank**skew over a random ranking of customers;
+    lognormal: weight ~ LogNormal(0, skew).
+    """
+    if dist == "uniform":
+        weights = np.ones(n_customers)
+    elif dist == "zipf":
+        weights = 1.0 / rng.permutation(np.arange(1, n_customers + 1)) ** skew
+    elif dist == "lognormal":
+        weights = rng.lognormal(0.0, skew, n_customers)
+    else:
+        raise ValueError(f"Unknown order distribution: {dist}")
+    return weights / weights.sum()
 
 
 # --------------------------------------------------------------
-# 2. CUSTOMERS
+# 1. STORES
 # --------------------------------------------------------------
-def generate_customers(n_customers: int = 10000):
-    first_names = [
-        "Alex","Blake","Chitra","Dev","Esha","Farhan","Gia","Hari",
-        "Isha","Kabir","Lena","Mira","Nikhil","Om","Priya","Rohan",
-        "Sara","Tanvi","Uma","Vikram"
-    ]
-
-    last_names = [
-        "Sharma","Patel","Rao","Iyer","Khan","Singh","Nair","Das",
-        "Mehta","Kulkarni"
-    ]
-
-    tiers = ["Bronze", "Silver", "Gold", "Platinum"]
+def generate_stores(n_stores: int, out_dir: Path, fmt: str, rng: np.random.Generator, city_skew: float = 0.0):
+    writer = TableWriter(out_dir, "stores", fmt)
+    number = np.arange(1, n_stores + 1)
+    city = rng.choice(len(CITIES), size=n_stores, p=city_weights(city_skew))
+
+    # store location within 1–2 km of center
+    writer.write({
+        "store_id": ids("store_", number, 3),
+        "name": pc.binary_join_element_wise(
+            pc.take(pa.array(CITIES), pa.array(city)), ids("Coffee #", number, 1), " "
+        ),
+        "city": categorical(city, CITIES),
+        "lat": np.round(CITY_LATS[city] + rng.uniform(-0.02, 0.02, n_stores), 6),
+        "lon": np.round(CITY_LONS[city] + rng.uniform(-0.02, 0.02, n_stores), 6),
+        "open_hour": rng.integers(7, 10, n_stores),
+        "close_hour": rng.integers(20, 24, n_stores),
+    })
+    writer.close()
 
-    rows = []
 
-    for i in range(1, n_customers + 1):
-        city = random.choice(list(CITY_COORDS.keys()))
-        base_lat, base_lon = CITY_COORDS[city]
+# --------------------------------------------------------------
+# 2. CUSTOMERS
+# --------------------------------------------------------------
+def generate_customers(
+    n_customers: int,
+    out_dir: Path,
+    fmt: str,
+    rng: np.random.Generator,
+    city_skew: float = 0.0,
+    chunk_size: int = 1_000_000,
+):
+    writer = TableWriter(out_dir, "customers", fmt)
+    weights = city_weights(city_skew)
+    col = column_rngs(rng, ["city", "first", "last", "lat", "lon", "tier"])
+
+    for start, n in chunks(n_customers, chunk_size):
+        city = col["city"].choice(len(CITIES), size=n, p=weights)
+        first = pc.take(pa.array(FIRST_NAMES), pa.array(randint(col["first"], 0, len(FIRST_NAMES), n)))
+        last = pc.take(pa.array(LAST_NAMES), pa.array(randint(col["last"], 0, len(LAST_NAMES), n)))
 
         # customer lives within 2 km of the city
-        lat = round(base_lat + random.uniform(-0.03, 0.03), 6)
-        lon = round(base_lon + random.uniform(-0.03, 0.03), 6)
-
-        name = f"{random.choice(first_names)} {random.choice(last_names)}"
-        tier = np.random.choice(tiers, p=[0.5, 0.3, 0.15, 0.05])
-
-        rows.append({
-            "customer_id": f"cust_{i:05d}",
-            "name": name,
-            "city": city,
-            "lat": lat,
-            "lon": lon,
-            "loyalty_tier": tier,
+        writer.write({
+            "customer_id": ids("cust_", np.arange(start + 1, start + n + 1), 5),
+            "name": pc.binary_join_element_wise(first, last, " "),
+            "city": categorical(city, CITIES),
+            "lat": np.round(CITY_LATS[city] + col["lat"].uniform(-0.03, 0.03, n), 6),
+            "lon": np.round(CITY_LONS[city] + col["lon"].uniform(-0.03, 0.03, n), 6),
+            "loyalty_tier": categorical(col["tier"].choice(len(TIERS), size=n, p=TIER_P), TIERS),
         })
-
-    path = DATA_DIR / "customers.csv"
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=["customer_id", "name", "city", "lat", "lon", "loyalty_tier"]
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+    writer.close()
 
 
 # --------------------------------------------------------------
 # 3. ORDERS
 # --------------------------------------------------------------
-def generate_orders(n_orders: int = 100000):
-    customers_path = DATA_DIR / "customers.csv"
-    stores_path = DATA_DIR / "stores.csv"
-
-    customers = [row["customer_id"] for row in csv.DictReader(customers_path.open())]
-    stores = [row["store_id"] for row in csv.DictReader(stores_path.open())]
-
-    drinks = ["Latte", "Cappuccino", "Espresso", "Hot Cocoa", "Cold Brew", "Mocha"]
-
-    start_date = datetime(2025, 1, 1)
-    rows = []
-
-    for i in range(1, n_orders + 1):
-        cust = random.choice(customers)
-        store = random.choice(stores)
-
-        created_at = start_date + timedelta(
-            days=random.randint(0, 180),
-            hours=random.randint(7, 22),
-            minutes=random.randint(0, 59),
-        )
-
-        item = random.choice(drinks)
-        quantity = np.random.choice([1, 2, 3], p=[0.7, 0.2, 0.1])
-        total_amount = round(quantity * np.random.uniform(2.5, 6.0), 2)
-
-        status = np.random.choice(
-            ["placed", "preparing", "ready", "delivered"],
-            p=[0.1, 0.2, 0.2, 0.5],
-        )
-
-        rows.append({
-            "order_id": f"ord_{i:06d}",
-            "customer_id": cust,
-            "store_id": store,
-            "status": status,
-            "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S"),
-            "item": item,
+def generate_orders(
+    n_orders: int,
+    n_customers: int,
+    n_stores: int,
+    out_dir: Path,
+    fmt: str,
+    rng: np.random.Generator,
+    dist: str = "uniform",
+    skew: float = 1.0,
+    chunk_size: int = 1_000_000,
+):
+    writer = TableWriter(out_dir, "orders", fmt)
+    store_ids = ids("store_", np.arange(1, n_stores + 1), 3).to_pylist()
+
+    # Exactly n_orders split across customers by the chosen distribution.
+    # Rows are written grouped by customer, about chunk_size orders at a time.
+    counts = rng.multinomial(n_orders, customer_weights(n_customers, dist, skew, rng))
+    col = column_rngs(rng, ["days", "hours", "minutes", "quantity", "store", "status", "item", "price"])
+    ends = np.cumsum(counts)
+    cuts = np.searchsorted(ends, np.arange(chunk_size, n_orders, chunk_size)) + 1
+    bounds = np.unique(np.concatenate([[0], cuts, [n_customers]]))
+
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        customer = np.repeat(np.arange(first, last), counts[first:last])
+        n = len(customer)
+        if not n:
+            continue
+        start = int(ends[first - 1]) if first else 0
+
+        days = randint(col["days"], 0, 181, n)
+        hours = randint(col["hours"], 7, 23, n)
+        minutes = randint(col["minutes"], 0, 60, n)
+        created_at = ORDERS_START + (days * 86400 + hours * 3600 + minutes * 60).astype("timedelta64[s]")
+        quantity = col["quantity"].choice([1, 2, 3], size=n, p=QUANTITY_P)
+
+        writer.write({
+            "order_id": ids("ord_", np.arange(start + 1, start + n + 1), 6),
+            "customer_id": ids("cust_", customer + 1, 5),
+            "store_id": categorical(randint(col["store"], 0, n_stores, n), store_ids),
+            "status": categorical(col["status"].choice(len(STATUSES), size=n, p=STATUS_P), STATUSES),
+            "created_at": pa.array(created_at),
+            "item": categorical(randint(col["item"], 0, len(DRINKS), n), DRINKS),
             "quantity": quantity,
-            "total_amount": total_amount,
+            "total_amount": np.round(quantity * col["price"].uniform(2.5, 6.0, n), 2),
         })
-
-    path = DATA_DIR / "orders.csv"
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "order_id", "customer_id", "store_id", "status",
-                "created_at", "item", "quantity", "total_amount"
-            ]
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+    writer.close()
 
 
 # --------------------------------------------------------------
 # 4. COUPONS
 # --------------------------------------------------------------
-def generate_coupons(max_coupons: int = 40000):
-    customers_path = DATA_DIR / "customers.csv"
-    stores_path = DATA_DIR / "stores.csv"
-
-    customers = [row["customer_id"] for row in csv.DictReader(customers_path.open())]
-    stores = [row["store_id"] for row in csv.DictReader(stores_path.open())]
-
-    rows = []
-    coupon_id = 1
-
-    for cust in customers:
-        n = np.random.choice([0, 1, 2, 3], p=[0.5, 0.3, 0.15, 0.05])
-        for _ in range(n):
-            if coupon_id > max_coupons:
-                break
-
-            store = random.choice(stores)
-            discount = np.random.choice([5, 10, 15, 20], p=[0.4, 0.3, 0.2, 0.1])
-
-            valid_from = datetime(2025, 6, 1) + timedelta(days=random.randint(0, 30))
-            valid_to = valid_from + timedelta(days=random.randint(7, 30))
-
-            rows.append({
-                "coupon_id": f"cpn_{coupon_id:06d}",
-                "customer_id": cust,
-                "store_id": store,
-                "discount_percent": discount,
-                "valid_from": valid_from.strftime("%Y-%m-%d"),
-                "valid_to": valid_to.strftime("%Y-%m-%d"),
-            })
-            coupon_id += 1
-
-        if coupon_id > max_coupons:
+def generate_coupons(
+    max_coupons: int,
+    n_customers: int,
+    n_stores: int,
+    out_dir: Path,
+    fmt: str,
+    rng: np.random.Generator,
+    chunk_size: int = 1_000_000,
+):
+    writer = TableWriter(out_dir, "coupons", fmt)
+    store_ids = ids("store_", np.arange(1, n_stores + 1), 3).to_pylist()
+    col = column_rngs(rng, ["per_customer", "valid_from", "valid_days", "store", "discount"])
+    written = 0
+
+    for start, n in chunks(n_customers, chunk_size):
+        per_customer = col["per_customer"].choice(len(COUPONS_PER_CUSTOMER_P), size=n, p=COUPONS_PER_CUSTOMER_P)
+        customer = np.repeat(np.arange(start, start + n), per_customer)[: max_coupons - written]
+        m = len(customer)
+        if not m:
             break
 
-    path = DATA_DIR / "coupons.csv"
-    with path.open("w", newline="", encoding="utf-8") as f:
-        writer = csv.DictWriter(
-            f,
-            fieldnames=[
-                "coupon_id", "customer_id", "store_id",
-                "discount_percent", "valid_from", "valid_to"
-            ]
-        )
-        writer.writeheader()
-        writer.writerows(rows)
+        valid_from = COUPONS_START + randint(col["valid_from"], 0, 31, m).astype("timedelta64[D]")
+        valid_to = valid_from + randint(col["valid_days"], 7, 31, m).astype("timedelta64[D]")
+        writer.write({
+            "coupon_id": ids("cpn_", np.arange(written + 1, written + m + 1), 6),
+            "customer_id": ids("cust_", customer + 1, 5),
+            "store_id": categorical(randint(col["store"], 0, n_stores, m), store_ids),
+            "discount_percent": np.asarray(DISCOUNTS)[col["discount"].choice(len(DISCOUNTS), size=m, p=DISCOUNT_P)],
+            "valid_from": pa.array(valid_from),
+            "valid_to": pa.array(valid_to),
+        })
+        written += m
+    writer.close()
 
 
 # --------------------------------------------------------------
 # MAIN
 # --------------------------------------------------------------
 def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", type=int, default=1, help="multiply the default row counts (e.g. 10, 100)")
+    parser.add_argument("--stores", type=int, help="number of stores (default 50 x scale)")
+    parser.add_argument("--customers", type=int, help="number of customers (default 10,000 x scale)")
+    parser.add_argument("--orders", type=int, help="number of orders (default 100,000 x scale)")
+    parser.add_argument("--max-coupons", type=int, help="cap on coupons (default 40,000 x scale)")
+    parser.add_argument("--city-skew", type=float, default=0.0, help="Zipf exponent of city popularity, 0 = uniform")
+    parser.add_argument(
+        "--orders-dist",
+        choices=["uniform", "zipf", "lognormal"],
+        default="uniform",
+        help="how orders are spread over customers",
+    )
+    parser.add_argument("--orders-skew", type=float, default=1.0, help="zipf exponent or lognormal sigma")
+    parser.add_argument("--format", choices=["csv", "arrow"], default="csv", help="output file format")
+    parser.add_argument("--chunk-size", type=int, default=1_000_000, help="rows generated and written per chunk")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out-dir", type=Path, default=DATA_DIR, help="where to write the tables")
+    args = parser.parse_args()
+
+    n_stores = args.stores if args.stores is not None else 50 * args.scale
+    n_customers = args.customers if args.customers is not None else 10000 * args.scale
+    n_orders = args.orders if args.orders is not None else 100000 * args.scale
+    max_coupons = args.max_coupons if args.max_coupons is not None else 40000 * args.scale
+
+    out_dir = args.out_dir
+    out_dir.mkdir(parents=True, exist_ok=True)
+    # One independent stream per table: changing one table's size does not
+    # change the rows of the others.
+    store_rng, customer_rng, order_rng, coupon_rng = (
+        np.random.default_rng(s) for s in np.random.SeedSequence(args.seed).spawn(4)
+    )
+    started = time.perf_counter()
+
     print("Generating stores...")
-    generate_stores()
+    generate_stores(n_stores, out_dir, args.format, store_rng, args.city_skew)
 
     print("Generating customers...")
-    generate_customers()
+    generate_customers(n_customers, out_dir, args.format, customer_rng, args.city_skew, args.chunk_size)
 
     print("Generating orders...")
-    generate_orders()
+    generate_orders(
+        n_orders,
+        n_customers,
+        n_stores,
+        out_dir,
+        args.format,
+        order_rng,
+        args.orders_dist,
+        args.orders_skew,
+        args.chunk_size,
+    )
 
     print("Generating coupons...")
-    generate_coupons()
+    generate_coupons(max_coupons, n_customers, n_stores, out_dir, args.format, coupon_rng, args.chunk_size)
 
-    print("\nDone! CSV files ready in /data 🎉")
+    print(f"\nDone in {time.perf_counter() - started:.1f}s! Files ready in {out_dir} 🎉")
 
 
 if __name__ == "__main__":
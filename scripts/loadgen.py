@@ -0,0 +1,151 @@
+"""
+End-to-end load generator for POST /chat.
+
+Replays a JSON-lines file of /chat request bodies
+({"user_id", "message", "location": {"lat", "lon"}}) with a fixed number
+of concurrent clients and reports p50/p95/p99 latency and requests per
+second. Without --url the app runs in-process against the stub LLM
+provider, so no server or API key is needed. Run from the repo root:
+
+    python scripts/loadgen.py --scale 10 --total 5000 --concurrency 64
+    python scripts/loadgen.py --requests-file chat.jsonl --url http://127.0.0.1:8000
+
+Without --requests-file, requests are sampled from the dataset's
+customers (see --write-requests to save them for later replays).
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+import httpx
+import pandas as pd
+import yaml
+
+from bench import MESSAGES, ROOT, bench_config, dataset_dir, print_table, summarize
+
+sys.path.insert(0, str(ROOT))
+
+from src.llm_orchestrator import TEMPLATE_FALLBACK  # noqa: E402
+
+
+def load_requests(path: Path) -> List[Dict[str, Any]]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def sample_requests(data_dir: Path, total: int, seed: int) -> List[Dict[str, Any]]:
+    """
+    /chat bodies for random customers at their home location.
+    """
+    rng = random.Random(seed)
+    customers = pd.read_csv(data_dir / "customers.csv", usecols=["customer_id", "lat", "lon"])
+    rows = customers.sample(n=total, replace=True, random_state=seed)
+    return [
+        {"user_id": user_id, "message": rng.choice(MESSAGES), "location": {"lat": float(lat), "lon": float(lon)}}
+        for user_id, lat, lon in zip(rows["customer_id"], rows["lat"], rows["lon"])
+    ]
+
+
+def in_process_client(cfg: Dict[str, Any]) -> httpx.AsyncClient:
+    """
+    AsyncClient wired straight to the FastAPI app, loaded with ``cfg``.
+    """
+    with tempfile.NamedTemporaryFile("w", suffix=".yaml", delete=False, encoding="utf-8") as f:
+        yaml.safe_dump(cfg, f)
+    os.environ["PULSECX_CONFIG"] = f.name
+    os.chdir(ROOT)  # the app serves static/ relative to the working directory
+
+    from src.api import app
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://loadgen", timeout=60)
+
+
+async def replay(client: httpx.AsyncClient, requests: List[Dict[str, Any]], concurrency: int) -> Dict[str, Any]:
+    queue: asyncio.Queue = asyncio.Queue()
+    for body in requests:
+        queue.put_nowait(body)
+
+    latencies: List[float] = []
+    errors = 0
+    fallbacks = 0
+
+    async def worker() -> None:
+        nonlocal errors, fallbacks
+        while not queue.empty():
+            body = queue.get_nowait()
+            start = time.perf_counter()
+            try:
+                response = await client.post("/chat", json=body)
+                response.raise_for_status()
+                reply = response.json().get("reply")
+            except Exception:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+            fallbacks += reply == TEMPLATE_FALLBACK
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    return {**summarize(latencies, elapsed), "errors": errors, "fallbacks": fallbacks, "elapsed_s": round(elapsed, 3)}
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    data_dir = dataset_dir(args.scale)
+    if args.requests_file:
+        requests = load_requests(args.requests_file)
+    else:
+        requests = sample_requests(data_dir, args.total, args.seed)
+        if args.write_requests:
+            args.write_requests.write_text("".join(json.dumps(r) + "\n" for r in requests), encoding="utf-8")
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        cfg = bench_config(data_dir, rag=args.rag)
+        if args.llm_latency_ms is not None:
+            cfg["llm"].update({"stub_latency_ms": args.llm_latency_ms, "stub_jitter_ms": 0})
+        if args.no_response_cache:
+            cfg["response_cache"] = {"enabled": False}
+        client = in_process_client(cfg)
+
+    async with client:
+        for body in requests[: args.warmup]:
+            await client.post("/chat", json=body)
+        return await replay(client, requests, args.concurrency)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests-file", type=Path, help="JSON lines of /chat request bodies to replay")
+    parser.add_argument("--write-requests", type=Path, help="save the sampled requests to this file")
+    parser.add_argument("--url", help="base URL of a running server (default: in-process app, stub LLM)")
+    parser.add_argument("--scale", type=int, default=1, help="data scale for sampling and the in-process app")
+    parser.add_argument("--total", type=int, default=2000, help="requests to sample when no file is given")
+    parser.add_argument("--concurrency", type=int, default=32, help="concurrent clients")
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring")
+    parser.add_argument("--llm-latency-ms", type=float, help="in-process only: stub LLM latency")
+    parser.add_argument("--no-response-cache", action="store_true", help="in-process only: disable the reply cache")
+    parser.add_argument("--rag", action="store_true", help="in-process only: enable RAG")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", type=Path, help="also write the results to this file")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+    print_table(f"POST /chat ({args.scale}x data, concurrency {args.concurrency})", {"/chat": result})
+    print(f"errors: {result['errors']}  template fallbacks: {result['fallbacks']}  wall time: {result['elapsed_s']}s")
+
+    if args.json:
+        args.json.write_text(json.dumps({"scale": args.scale, "concurrency": args.concurrency, **result}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
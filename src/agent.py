@@ -1,11 +1,38 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
 from datetime import datetime
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Callable, Dict, List, Tuple
 
+import pandas as pd
+
+from .batching import MicroBatcher
+from .cache import ResponseCache, TTLCache
 from .config import load_config
-from .data_loader import load_all_data, get_customer, get_recent_orders, get_active_coupons
-from .geo import find_nearest_open_store
-from .llm_orchestrator import build_prompt, call_llm
+from .data_loader import load_all_data, CsvTailer, CustomerIndex, FileShrunk
+from .geo import StoreIndex
+from .llm_orchestrator import (
+    TEMPLATE_FALLBACK,
+    build_prompt,
+    call_llm,
+    call_llm_async,
+    estimate_tokens,
+    render_cache_context,
+    render_customer_context,
+    StreamInterrupted,
+    stream_llm,
+)
+from .metrics import DEGRADED, PROMPT_TOKENS, REGISTRY, Family, observe_stage
+from .privacy import get_masker
 from .rag import RAGIndex
+from .shared_data import SharedCustomerIndex, attach, current_generation, publish, publish_lock, shared_dir
+
+logger = logging.getLogger(__name__)
+
+# Per-stage budgets (ms) for the context fan-out; overridable via agent.stage_timeouts_ms.
+DEFAULT_STAGE_TIMEOUTS_MS = {"data": 100, "rag": 300}
 
 
 class PulseCXAgent:
@@ -15,51 +42,875 @@ class PulseCXAgent:
 
     def __init__(self, config_path: str = "config.yaml") -> None:
         self.config = load_config(config_path)
-        self.customers, self.orders, self.stores, self.coupons = load_all_data(self.config)
 
+        # Built by warm_up(); until then requests are answered degraded.
+        self.customers = self.orders = self.stores = self.coupons = None
+        self.customer_index: CustomerIndex | None = None
+        self.store_index: StoreIndex | None = None
+        # Set in shared_data mode: customer data is memory-mapped from a published generation.
+        self.shared_store = None
+        self.rag_index: RAGIndex | None = None
+        self.rag_batcher: MicroBatcher | None = None
+        self._ingest_lock = threading.Lock()
+        rag_enabled = self.config.get("rag", {}).get("enabled", False)
+        self.warmup_status: Dict[str, str] = {
+            "data": "pending",
+            "geo": "pending",
+            "rag": "pending" if rag_enabled else "disabled",
+        }
+        self.warmed_up = threading.Event()
+
+        self.masker = get_masker(self.config.get("privacy"))
+        # Customer data for an unknown customer, and for a data stage that failed or ran out of time.
+        self._unknown_customer = (
+            None, [], [], render_customer_context(None, [], [], self.config.get("prompt"), self.config.get("privacy"))
+        )
+        self.response_cache = self._build_response_cache(self.config.get("response_cache", {}))
+        self.distance_bucket_m = self.config.get("response_cache", {}).get("distance_bucket_m", 250)
+
+        context_cfg = self.config.get("context_cache", {})
+        self.context_cache = None
+        if context_cfg.get("enabled", False):
+            self.context_cache = TTLCache(
+                context_cfg.get("max_entries", 10000), context_cfg.get("ttl_s", 3600)
+            )
+
+        agent_cfg = self.config.get("agent", {})
+        self.stage_timeouts_ms = {
+            **DEFAULT_STAGE_TIMEOUTS_MS,
+            **agent_cfg.get("stage_timeouts_ms", {}),
+        }
+        self._stage_pool = ThreadPoolExecutor(
+            max_workers=agent_cfg.get("stage_workers", 8),
+            thread_name_prefix="pulsecx-stage",
+        )
+
+        REGISTRY.add_collector(self._collect_metrics)
+
+        self.startup_mode = self.config.get("startup", {}).get("mode", "eager")
+        if self.startup_mode == "background":
+            threading.Thread(target=self.warm_up, name="pulsecx-warmup", daemon=True).start()
+        else:
+            self.warm_up()
+
+    def close(self) -> None:
+        """
+        Stop reporting this agent's metrics and release its stage threads.
+        """
+        REGISTRY.remove_collector(self._collect_metrics)
+        self._stage_pool.shutdown(wait=False)
+
+    def warm_up(self) -> None:
+        """
+        Load the data and build the customer, geo and RAG indexes.
+
+        Each component is published as soon as it is built, so requests
+        served during a background warmup get better as it progresses. In
+        eager mode a failure is raised; in background mode it is logged and
+        left in warmup_status.
+        """
+        # Tailers start before the initial load so no appended row is missed;
+        # rows seen twice are harmless because ingestion upserts by ID.
+        ingest_cfg = self.config.get("ingest", {})
+        tailers = self._make_tailers() if ingest_cfg.get("watch", False) else None
+
+        started = time.perf_counter()
+        self._warm_component("data", self._warm_data)
+        if self.warmup_status["data"] == "ready":
+            self._warm_component("geo", self._warm_geo)
+            if self.shared_store is not None:
+                self.start_shared_watcher(self.config["shared_data"].get("poll_interval_s", 2.0))
+            if tailers is not None:
+                self.start_watcher(ingest_cfg.get("poll_interval_s", 5.0), tailers)
+        else:
+            self.warmup_status["geo"] = "failed"
+        if self.warmup_status["rag"] == "pending":
+            self._warm_component("rag", self._warm_rag)
+
+        self.warmed_up.set()
+        logger.info("Warmup finished in %.2fs: %s", time.perf_counter() - started, self.warmup_status)
+
+    def _warm_component(self, name: str, build: Callable[[], None]) -> None:
+        started = time.perf_counter()
+        try:
+            build()
+        except Exception:
+            self.warmup_status[name] = "failed"
+            if self.startup_mode != "background":
+                raise
+            logger.exception("Warmup of %s failed", name)
+            return
+        if self.warmup_status[name] == "pending":
+            self.warmup_status[name] = "ready"
+        logger.info("Warmed up %s in %.2fs", name, time.perf_counter() - started)
+
+    def _warm_data(self) -> None:
+        if self.config.get("shared_data", {}).get("enabled", False):
+            self._attach_shared()
+            return
+        customers, orders, stores, coupons = load_all_data(self.config)
+        # The DataFrames are the startup snapshot; ingested rows only go into
+        # the index, which is replaced (never mutated) on every update.
+        index = CustomerIndex(customers, orders, coupons)
+        with self._ingest_lock:
+            self.customers, self.orders, self.stores, self.coupons = customers, orders, stores, coupons
+            self.customer_index = index
+
+    def _attach_shared(self) -> int:
+        """
+        Attach to the current shared data generation (publishing it if
+        needed) and swap in an index over it. Rows ingested into the
+        previous index are dropped: they are expected to be in the new
+        generation's source files.
+        """
+        store = attach(self.config)
+        stores = store.frame("stores")
+        with self._ingest_lock:
+            previous = self.customer_index
+            index = SharedCustomerIndex(store, 0 if previous is None else previous.generation + 1)
+            self.shared_store, self.stores = store, stores
+            if self.store_index is not None:
+                self.store_index = StoreIndex(stores)
+            self.customer_index = index
+        logger.info("Attached shared data generation %d (%s)", store.generation, store.manifest["rows"])
+        return index.generation
+
+    def start_shared_watcher(self, poll_interval_s: float = 2.0) -> threading.Thread:
+        """
+        Poll the shared data directory and re-attach when another process
+        publishes a new generation.
+        """
+        directory = shared_dir(self.config)
+
+        def watch() -> None:
+            while True:
+                time.sleep(poll_interval_s)
+                try:
+                    generation = current_generation(directory)
+                    if generation is not None and generation != self.shared_store.generation:
+                        self._attach_shared()
+                except Exception as exc:
+                    logger.warning("Shared data watcher error: %s", exc)
+
+        thread = threading.Thread(target=watch, name="pulsecx-shared-data", daemon=True)
+        thread.start()
+        return thread
+
+    def _warm_geo(self) -> None:
+        self.store_index = StoreIndex(self.stores)
+
+    def _warm_rag(self) -> None:
         rag_cfg = self.config.get("rag", {})
-        self.rag_index = None
-        if rag_cfg.get("enabled", False):
-            self.rag_index = RAGIndex(rag_cfg["docs_path"])
-            self.rag_index.build()
+        index_cfg = dict(rag_cfg.get("index", {}))
+        ingest_cfg = rag_cfg.get("ingest", {})
+        rag_index = RAGIndex(
+            rag_cfg["docs_path"],
+            model_name=rag_cfg.get("model", "all-MiniLM-L6-v2"),
+            cache_dir=rag_cfg.get("cache_dir"),
+            query_cache_size=rag_cfg.get("query_cache_size", 1024),
+            query_cache_ttl_s=rag_cfg.get("query_cache_ttl_s", 600),
+            index_type=index_cfg.pop("type", "flat_l2"),
+            index_params=index_cfg,
+            chunk_tokens=ingest_cfg.get("chunk_tokens", 100),
+            chunk_overlap=ingest_cfg.get("chunk_overlap", 20),
+            embed_batch_size=ingest_cfg.get("embed_batch_size", 64),
+            ingest_workers=ingest_cfg.get("workers") or None,
+            retriever=rag_cfg.get("retriever", "dense"),
+            bm25_params=rag_cfg.get("bm25"),
+        )
+        if self.config.get("shared_data", {}).get("enabled", False) and rag_cfg.get("cache_dir"):
+            # One worker embeds and saves the index; the others wait, then load (mmap) it from the cache.
+            # Its own lock file: a cold build can take minutes and must not block data publishing.
+            with publish_lock(shared_dir(self.config), ".rag.lock"):
+                rag_index.build()
+        else:
+            rag_index.build()
+        if not rag_index.chunks:
+            # No documents: run without RAG, as before.
+            self.warmup_status["rag"] = "disabled"
+            return
+        # A cached index loads without the model; load it now rather than on the first query.
+        rag_index.warm_model()
+
+        # Optional: coalesce concurrent single-message RAG lookups into one batch.
+        micro_cfg = rag_cfg.get("micro_batch", {})
+        if micro_cfg.get("enabled", False):
+            top_k = rag_cfg.get("top_k", 3)
+            self.rag_batcher = MicroBatcher(
+                lambda queries: rag_index.retrieve_batch(queries, top_k=top_k),
+                window_ms=micro_cfg.get("window_ms", 5),
+                max_batch=micro_cfg.get("max_batch", 64),
+                name="pulsecx-rag-batcher",
+            )
+        if self.response_cache is not None and self.config.get("response_cache", {}).get("semantic", False):
+            if rag_index.retriever == "bm25":
+                logger.warning("Semantic response cache needs embeddings; disabled with the BM25 retriever")
+            else:
+                self.response_cache.embed_fn = rag_index.embed
+        self.rag_index = rag_index
+
+    def is_ready(self) -> bool:
+        """
+        True once every enabled component has been built.
+        """
+        return all(status in ("ready", "disabled") for status in self.warmup_status.values())
+
+    def _not_ready(self) -> List[str]:
+        return [name for name, status in self.warmup_status.items() if status not in ("ready", "disabled")]
+
+    def ingest(
+        self,
+        customers: pd.DataFrame | None = None,
+        orders: pd.DataFrame | None = None,
+        coupons: pd.DataFrame | None = None,
+    ) -> Dict[str, int]:
+        """
+        Apply new or updated rows without a restart.
+
+        Builds a copy-on-write CustomerIndex with the delta and swaps it in
+        with one assignment; in-flight requests keep using the index they
+        already hold. Context-cache entries of touched customers become
+        stale through CustomerIndex.is_current. Raises RuntimeError while
+        the initial load is still running.
+        """
+        with self._ingest_lock:
+            if self.customer_index is None:
+                raise RuntimeError("Customer data is still loading")
+            self.customer_index = self.customer_index.apply_delta(customers, orders, coupons)
+            generation = self.customer_index.generation
+
+        counts = {
+            "customers": 0 if customers is None else len(customers),
+            "orders": 0 if orders is None else len(orders),
+            "coupons": 0 if coupons is None else len(coupons),
+        }
+        logger.info("Ingested %s (generation %d)", counts, generation)
+        return {"generation": generation, **counts}
 
-    def _get_rag_snippets(self, message: str) -> List[str]:
-        if self.rag_index is None:
+    def reload(self) -> int:
+        """
+        Full reload of all tables from disk, swapped in atomically.
+
+        In shared_data mode this publishes a new generation (if the source
+        files changed) and attaches to it; other workers follow through
+        their shared data watcher.
+        """
+        if self.shared_store is not None:
+            publish(self.config)
+            generation = self._attach_shared()
+            logger.info("Reloaded shared data (generation %d)", generation)
+            return generation
+        customers, orders, stores, coupons = load_all_data(self.config)
+        with self._ingest_lock:
+            index = CustomerIndex(customers, orders, coupons, self.customer_index.generation + 1)
+            self.customers, self.orders, self.stores, self.coupons = customers, orders, stores, coupons
+            self.store_index = StoreIndex(stores)
+            self.customer_index = index
+        logger.info("Reloaded all data (generation %d)", index.generation)
+        return index.generation
+
+    def _make_tailers(self) -> Dict[str, CsvTailer]:
+        data_cfg = self.config["data"]
+        return {name: CsvTailer(name, data_cfg[name]) for name in ("customers", "orders", "coupons")}
+
+    def start_watcher(
+        self, poll_interval_s: float = 5.0, tailers: Dict[str, CsvTailer] | None = None
+    ) -> threading.Thread:
+        """
+        Poll the customers/orders/coupons CSVs for appended rows and ingest them.
+
+        Tailer offsets only move once the rows are ingested, so a failed
+        poll is retried. Rows that can never be ingested (ValueError: bad
+        dates, missing keys) are logged with their raw text and skipped,
+        without holding back the other tables. A file that shrinks
+        (rewritten rather than appended to) triggers a full reload.
+        """
+        if tailers is None:
+            tailers = self._make_tailers()
+
+        def watch() -> None:
+            nonlocal tailers
+            reload_pending = False
+            while True:
+                time.sleep(poll_interval_s)
+                if not reload_pending:
+                    try:
+                        self._ingest_tailed(tailers)
+                    except FileShrunk as exc:
+                        logger.warning("%s; doing a full reload", exc)
+                        reload_pending = True
+                    except Exception as exc:
+                        logger.warning("Ingestion watcher error: %s", exc)
+                if reload_pending:
+                    # Retried every poll until it succeeds (e.g. the CSV is missing mid-rewrite).
+                    try:
+                        tailers = self._make_tailers()
+                        self.reload()
+                        reload_pending = False
+                    except Exception as exc:
+                        logger.warning("Full reload failed, retrying: %s", exc)
+
+        thread = threading.Thread(target=watch, name="pulsecx-ingest", daemon=True)
+        thread.start()
+        return thread
+
+    def _ingest_tailed(self, tailers: Dict[str, CsvTailer]) -> None:
+        delta: Dict[str, pd.DataFrame | None] = {}
+        for name, tailer in tailers.items():
+            try:
+                delta[name] = tailer.read_new()
+            except ValueError as exc:
+                self._skip_tailed_rows(tailer, exc)
+                delta[name] = None
+        if any(df is not None for df in delta.values()):
+            try:
+                self.ingest(**delta)
+            except ValueError:
+                # Some table's rows are invalid: ingest each table on its own, skipping only the bad ones.
+                for name, df in delta.items():
+                    if df is not None:
+                        try:
+                            self.ingest(**{name: df})
+                        except ValueError as exc:
+                            self._skip_tailed_rows(tailers[name], exc)
+        # Only reached when nothing failed for a retryable reason.
+        for tailer in tailers.values():
+            tailer.commit()
+
+    @staticmethod
+    def _skip_tailed_rows(tailer: CsvTailer, exc: Exception) -> None:
+        logger.error(
+            "Skipping %s rows that cannot be ingested (%s):\n%s",
+            tailer.name,
+            exc,
+            tailer.pending_rows.decode("utf-8", errors="replace"),
+        )
+
+    def _build_response_cache(self, cache_cfg: Dict[str, Any]) -> ResponseCache | None:
+        if not cache_cfg.get("enabled", False):
+            return None
+
+        # The embedding function is attached once the RAG model has warmed up.
+        if cache_cfg.get("semantic", False) and self.warmup_status["rag"] == "disabled":
+            logger.warning("Semantic response cache needs RAG enabled; using exact matching only")
+
+        return ResponseCache(
+            max_entries=cache_cfg.get("max_entries", 2048),
+            ttl_s=cache_cfg.get("ttl_s", 300),
+            similarity_threshold=cache_cfg.get("similarity_threshold", 0.92),
+        )
+
+    def _remember_reply(self, cache_key: Any, reply: str) -> None:
+        # Fallback replies signal a provider error or timeout; never cache them.
+        if self.response_cache is not None and cache_key is not None and reply != TEMPLATE_FALLBACK:
+            self.response_cache.store(cache_key, reply)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        stats: Dict[str, Any] = {}
+        if self.response_cache is not None:
+            stats["response"] = self.response_cache.stats()
+        if self.context_cache is not None:
+            stats["context"] = self.context_cache.stats()
+        if self.rag_index is not None:
+            stats["rag"] = self.rag_index.cache_stats()
+        return stats
+
+    def _collect_metrics(self) -> List[Family]:
+        """
+        Scrape-time metrics: cache counters and warmup state.
+        """
+        caches = {}
+        if self.response_cache is not None:
+            caches["response"] = self.response_cache.stats()
+        if self.context_cache is not None:
+            caches["context"] = self.context_cache.stats()
+        rag_index = self.rag_index
+        if rag_index is not None:
+            for name, stats in rag_index.cache_stats().items():
+                caches[f"rag_{name}"] = stats
+
+        families: List[Family] = []
+        for field, kind, help_text in (
+            ("hits", "counter", "Cache hits by cache."),
+            ("misses", "counter", "Cache misses by cache."),
+            ("evictions", "counter", "Cache evictions by cache."),
+            ("size", "gauge", "Entries currently cached."),
+        ):
+            suffix = "_total" if kind == "counter" else ""
+            samples = [({"cache": name}, stats[field]) for name, stats in caches.items()]
+            families.append((f"pulsecx_cache_{field}{suffix}", kind, help_text, samples))
+        if self.response_cache is not None:
+            families.append((
+                "pulsecx_cache_semantic_hits_total",
+                "counter",
+                "Response-cache hits served by a similar (not identical) message.",
+                [({}, self.response_cache.semantic_hits)],
+            ))
+
+        families.append((
+            "pulsecx_component_ready",
+            "gauge",
+            "1 once a component has warmed up (or is disabled).",
+            [
+                ({"component": name}, float(status in ("ready", "disabled")))
+                for name, status in self.warmup_status.items()
+            ],
+        ))
+        index = self.customer_index
+        if index is not None:
+            families.append(
+                ("pulsecx_data_generation", "gauge", "Customer index generation.", [({}, index.generation)])
+            )
+        store = self.shared_store
+        if store is not None:
+            families.append((
+                "pulsecx_shared_data_generation",
+                "gauge",
+                "Published shared data generation this worker is attached to.",
+                [({}, store.generation)],
+            ))
+        return families
+
+    def _get_rag_snippets(self, message: str, timings: Dict[str, float] | None = None) -> List[str]:
+        rag_index = self.rag_index
+        if rag_index is None:
             return []
         rag_cfg = self.config.get("rag", {})
         top_k = rag_cfg.get("top_k", 3)
-        return self.rag_index.retrieve(message, top_k=top_k)
+        return rag_index.retrieve(message, top_k=top_k, timings=timings)
 
-    def handle_message(
+    @staticmethod
+    def _timed(
+        timings: Dict[str, float], name: str, fn: Callable[..., Any], *args: Any, observe: bool = True
+    ) -> Any:
+        """
+        Run fn(*args), recording its duration in timings[name] (ms) and,
+        unless observe is False, in the stage latency histogram.
+        """
+        start = time.perf_counter()
+        try:
+            return fn(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            timings[name] = round(elapsed * 1000, 3)
+            if observe:
+                observe_stage(name, elapsed)
+
+    @staticmethod
+    def _record_llm(payload: Dict[str, Any], started: float, reply: str) -> None:
+        """
+        Record an LLM call as the "llm" stage, or as "fallback" if it ended in TEMPLATE_FALLBACK.
+        """
+        elapsed = time.perf_counter() - started
+        stage = "fallback" if reply == TEMPLATE_FALLBACK else "llm"
+        observe_stage(stage, elapsed)
+        payload["timings"][stage] = round(elapsed * 1000, 3)
+
+    def _submit_stage(self, timings: Dict[str, float], name: str, fn: Callable[..., Any], *args: Any) -> Future:
+        return self._stage_pool.submit(self._timed, timings, name, fn, *args)
+
+    def _submit_rag(self, message: str, timings: Dict[str, float]) -> Tuple[Future | None, float]:
+        """
+        Start RAG retrieval for ``message``; returns (future or None, start time of its budget).
+        """
+        started = time.perf_counter()
+        if self.rag_batcher is not None:
+            future = self.rag_batcher.submit(message)
+            future.add_done_callback(
+                lambda _: timings.__setitem__("rag", round((time.perf_counter() - started) * 1000, 3))
+            )
+            return future, started
+        if self.rag_index is not None:
+            return self._submit_stage(timings, "rag", self._get_rag_snippets, message, timings), started
+        return None, started
+
+    def _stage_result(
         self,
-        user_id: str,
-        message: str,
-        lat: float,
-        lon: float,
-    ) -> Dict[str, Any]:
+        name: str,
+        future: Future,
+        started: float,
+        fallback: Any,
+        degraded: List[str],
+    ) -> Any:
         """
-        Main entrypoint: given user_id + message + location, return bot response payload.
+        Wait for a fanned-out stage until its budget (counted from ``started``) runs out.
         """
-        customer = get_customer(self.customers, user_id)
-        recent_orders = get_recent_orders(self.orders, user_id)
-        active_coupons = get_active_coupons(self.coupons, user_id)
+        deadline = started + self.stage_timeouts_ms[name] / 1000
+        try:
+            return future.result(timeout=max(0.0, deadline - time.perf_counter()))
+        except FutureTimeout:
+            future.cancel()  # only helps while it is still queued; a running stage finishes in the background
+            logger.warning("Stage %s exceeded %d ms; continuing without it", name, self.stage_timeouts_ms[name])
+        except Exception as exc:
+            logger.warning("Stage %s failed: %s", name, exc)
+        degraded.append(name)
+        DEGRADED.inc(stage=name)
+        return fallback
 
-        now = datetime.now()
-        store = find_nearest_open_store(self.stores, lat, lon, now.hour)
+    def _lookup_customer_data(self, user_id: str) -> Tuple[Any, List[Dict[str, Any]], List[Dict[str, Any]], str]:
+        """
+        Customer profile, recent orders, active coupons and their rendered prompt fragment.
 
+        Served from the per-customer context cache when enabled. Entries
+        remember the index generation they were built from and are discarded
+        once that customer's data changes (CustomerIndex.is_current); they
+        also expire no later than the customer's first coupon expiry.
+        Before the data has loaded the customer is unknown (None, no
+        orders, no coupons) and nothing is cached.
+        """
+        index = self.customer_index
+        if index is None:
+            return self._unknown_customer
+        if self.context_cache is not None:
+            cached = self.context_cache.get(user_id)
+            if cached is not None and index.is_current(user_id, cached[0]):
+                return cached[1]
+
+        customer = index.get_customer(user_id)
+        recent_orders = index.get_recent_orders(user_id)
+        active_coupons = index.get_active_coupons(user_id)
+        fragment = render_customer_context(
+            customer,
+            recent_orders,
+            active_coupons,
+            self.config.get("prompt"),
+            self.config.get("privacy"),
+        )
+        entry = (customer, recent_orders, active_coupons, fragment)
+
+        if self.context_cache is not None:
+            ttl_s = index.seconds_until_first_expiry(active_coupons)
+            if ttl_s is not None and self.context_cache.ttl_s is not None:
+                ttl_s = min(ttl_s, self.context_cache.ttl_s)
+            self.context_cache.set(user_id, (index.generation, entry), ttl_s=ttl_s)
+        return entry
+
+    @staticmethod
+    def _context_and_payload(
+        customer: Any,
+        recent_orders: List[Dict[str, Any]],
+        active_coupons: List[Dict[str, Any]],
+        store: Dict[str, Any] | None,
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         context = {
             "customer": customer,
             "recent_orders": recent_orders,
             "store": store,
             "coupons": active_coupons,
         }
-
-        rag_snippets = self._get_rag_snippets(message)
-        prompt = build_prompt(context, message, rag_snippets)
-        reply = call_llm(prompt, self.config["llm"])
-
-        return {
-            "reply": reply,
+        payload = {
             "store": store,
             "coupon": active_coupons[0] if active_coupons else None,
         }
+        return context, payload
+
+    def _prepare_batch(self, items: List[Dict[str, Any]]) -> List[Tuple[str | None, Dict[str, Any], Any]]:
+        """
+        Batched _prepare: one vectorized geo query for all locations and one
+        RAG forward pass for every message that missed the response cache.
+
+        Each item is a dict with user_id, message, lat and lon.
+        """
+        timings: Dict[str, float] = {}
+        degraded = self._not_ready()
+        now = datetime.now()
+
+        # Whole-batch stage times go to the histogram as batch_<stage> below.
+        customer_data = self._timed(
+            timings, "data", lambda: [self._lookup_customer_data(it["user_id"]) for it in items], observe=False
+        )
+        store_index = self.store_index
+        stores: List[Dict[str, Any] | None] = [None] * len(items)
+        if store_index is not None:
+            stores = self._timed(
+                timings,
+                "geo",
+                store_index.nearest_open_stores,
+                [it["lat"] for it in items],
+                [it["lon"] for it in items],
+                now.hour,
+                now.weekday(),
+                observe=False,
+            )
+
+        masked_messages = self.masker.mask_many(it["message"] for it in items)
+
+        prepared: List[List[Any]] = []
+        for (customer, recent_orders, active_coupons, fragment), store, masked in zip(
+            customer_data, stores, masked_messages
+        ):
+            context, payload = self._context_and_payload(customer, recent_orders, active_coupons, store)
+            cache_key = None
+            if self.response_cache is not None and "data" not in degraded:
+                cache_key, reply = self.response_cache.lookup(
+                    render_cache_context(fragment, store, self.distance_bucket_m), masked
+                )
+                if reply is not None:
+                    payload["reply"] = reply
+            prepared.append([context, payload, cache_key])
+
+        pending = [i for i, (_, payload, _) in enumerate(prepared) if "reply" not in payload]
+        snippets: List[List[str]] = [[] for _ in pending]
+        rag_index = self.rag_index
+        if rag_index is not None and pending:
+            top_k = self.config.get("rag", {}).get("top_k", 3)
+            snippets = self._timed(
+                timings,
+                "rag",
+                rag_index.retrieve_batch,
+                [items[i]["message"] for i in pending],
+                top_k,
+                observe=False,
+            )
+
+        results: List[Tuple[str | None, Dict[str, Any], Any]] = [
+            (None, payload, cache_key) for _, payload, cache_key in prepared
+        ]
+        for i, rag_snippets in zip(pending, snippets):
+            context, payload, cache_key = prepared[i]
+            prompt = build_prompt(
+                context,
+                items[i]["message"],
+                rag_snippets,
+                self.config.get("prompt"),
+                self.config.get("privacy"),
+                customer_fragment=customer_data[i][3],
+            )
+            PROMPT_TOKENS.observe(estimate_tokens(prompt))
+            results[i] = (prompt, payload, cache_key)
+
+        for name, ms in timings.items():
+            observe_stage(f"batch_{name}", ms / 1000)
+        for stage in degraded:
+            DEGRADED.inc(len(items), stage=stage)
+        for _, payload, _ in results:
+            payload["timings"] = dict(timings)
+            payload["degraded"] = list(degraded)
+        return results
+
+    def _prepare(
+        self,
+        user_id: str,
+        message: str,
+        lat: float,
+        lon: float,
+    ) -> Tuple[str | None, Dict[str, Any], Any]:
+        """
+        Assemble context and prompt.
+
+        Returns (prompt, payload, cache_key). On a response-cache hit the
+        payload already holds the reply and prompt is None; otherwise the
+        reply is missing and cache_key should be passed to _remember_reply.
+
+        RAG retrieval and the customer lookups are started on the stage
+        pool first, so they overlap each other, the geo search (on the
+        calling thread) and the response-cache check. Each runs under its
+        budget (agent.stage_timeouts_ms); a stage that misses it or fails is
+        listed in payload["degraded"] and the prompt is built without it
+        (no snippets, or an unknown customer). A response-cache hit cancels
+        RAG if it has not started yet; the cache is only consulted when the
+        customer data arrived. Per-stage latencies (ms) are in
+        payload["timings"].
+
+        Components that are still warming up (startup.mode: background) are
+        skipped and listed in payload["degraded"] as well.
+        """
+        timings: Dict[str, float] = {}
+        degraded = self._not_ready()
+        for stage in degraded:
+            DEGRADED.inc(stage=stage)
+
+        rag_future, rag_started = self._submit_rag(message, timings)
+        data_started = time.perf_counter()
+        data_future = self._submit_stage(timings, "data", self._lookup_customer_data, user_id)
+
+        store = None
+        store_index = self.store_index
+        if store_index is not None:
+            now = datetime.now()
+            try:
+                store = self._timed(
+                    timings, "geo", store_index.nearest_open_store, lat, lon, now.hour, now.weekday()
+                )
+            except Exception as exc:
+                logger.warning("Stage geo failed: %s", exc)
+                degraded.append("geo")
+                DEGRADED.inc(stage="geo")
+
+        customer, recent_orders, active_coupons, fragment = self._stage_result(
+            "data", data_future, data_started, self._unknown_customer, degraded
+        )
+        context, payload = self._context_and_payload(customer, recent_orders, active_coupons, store)
+        payload["degraded"] = degraded
+
+        cache_key = None
+        if self.response_cache is not None and "data" not in degraded:
+            cache_key, reply = self._timed(
+                timings,
+                "response_cache",
+                self.response_cache.lookup,
+                render_cache_context(fragment, store, self.distance_bucket_m),
+                self.masker.mask_text(message),
+            )
+            if reply is not None:
+                if rag_future is not None:
+                    rag_future.cancel()  # a queued retrieval is dropped; a running one finishes unused
+                return None, {"reply": reply, **payload, "timings": dict(timings)}, cache_key
+
+        rag_snippets: List[str] = []
+        if rag_future is not None:
+            rag_snippets = self._stage_result("rag", rag_future, rag_started, [], degraded)
+
+        prompt = self._timed(
+            timings,
+            "prompt",
+            build_prompt,
+            context,
+            message,
+            rag_snippets,
+            self.config.get("prompt"),
+            self.config.get("privacy"),
+            fragment,
+        )
+        PROMPT_TOKENS.observe(estimate_tokens(prompt))
+        # Snapshot: a stage that missed its budget may still record its time later.
+        payload["timings"] = dict(timings)
+
+        return prompt, payload, cache_key
+
+    def handle_message(
+        self,
+        user_id: str,
+        message: str,
+        lat: float,
+        lon: float,
+    ) -> Dict[str, Any]:
+        """
+        Main entrypoint: given user_id + message + location, return bot response payload.
+        """
+        prompt, payload, cache_key = self._prepare(user_id, message, lat, lon)
+        if prompt is None:
+            return payload
+
+        started = time.perf_counter()
+        reply = call_llm(prompt, self.config["llm"])
+        self._record_llm(payload, started, reply)
+        self._remember_reply(cache_key, reply)
+
+        return {"reply": reply, **payload}
+
+    async def handle_message_async(
+        self,
+        user_id: str,
+        message: str,
+        lat: float,
+        lon: float,
+    ) -> Dict[str, Any]:
+        """
+        Async variant of handle_message for the /chat endpoint.
+
+        Context assembly (CPU-bound lookups, RAG encoding) runs in a worker
+        thread; the LLM call awaits the shared pooled client, so waiting on
+        the network does not tie up a thread.
+        """
+        prompt, payload, cache_key = await asyncio.to_thread(
+            self._prepare, user_id, message, lat, lon
+        )
+        if prompt is None:
+            return payload
+
+        started = time.perf_counter()
+        reply = await call_llm_async(prompt, self.config["llm"])
+        self._record_llm(payload, started, reply)
+        self._remember_reply(cache_key, reply)
+
+        return {"reply": reply, **payload}
+
+    def handle_messages(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Handle many messages at once (campaigns, offline jobs).
+
+        Each item is a dict with user_id, message, lat and lon. Results are
+        returned in input order; LLM calls run on at most
+        batch.llm_concurrency threads.
+        """
+        prepared = self._prepare_batch(items)
+        concurrency = self.config.get("batch", {}).get("llm_concurrency", 16)
+
+        def finish(entry: Tuple[str | None, Dict[str, Any], Any]) -> Dict[str, Any]:
+            prompt, payload, cache_key = entry
+            if prompt is None:
+                return payload
+            started = time.perf_counter()
+            reply = call_llm(prompt, self.config["llm"])
+            self._record_llm(payload, started, reply)
+            self._remember_reply(cache_key, reply)
+            return {"reply": reply, **payload}
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="pulsecx-batch") as pool:
+            return list(pool.map(finish, prepared))
+
+    async def handle_messages_async(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Async variant of handle_messages for the /chat/batch endpoint.
+
+        At most batch.llm_concurrency LLM calls from this batch are in flight
+        at once, leaving the rest of the client's capacity for live traffic.
+        """
+        prepared = await asyncio.to_thread(self._prepare_batch, items)
+        semaphore = asyncio.Semaphore(self.config.get("batch", {}).get("llm_concurrency", 16))
+
+        async def finish(entry: Tuple[str | None, Dict[str, Any], Any]) -> Dict[str, Any]:
+            prompt, payload, cache_key = entry
+            if prompt is None:
+                return payload
+            async with semaphore:
+                started = time.perf_counter()
+                reply = await call_llm_async(prompt, self.config["llm"])
+            self._record_llm(payload, started, reply)
+            self._remember_reply(cache_key, reply)
+            return {"reply": reply, **payload}
+
+        return list(await asyncio.gather(*(finish(entry) for entry in prepared)))
+
+    async def stream_message(
+        self,
+        user_id: str,
+        message: str,
+        lat: float,
+        lon: float,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """
+        Streaming variant of handle_message_async.
+
+        Yields ("context", {"store", "coupon"}) as soon as the context is
+        assembled, then ("token", text) per LLM token, then ("done",
+        {"reply": full_reply, "truncated": bool}). A truncated reply (the
+        LLM stream broke off after the first token) is never cached.
+        """
+        prompt, payload, cache_key = await asyncio.to_thread(
+            self._prepare, user_id, message, lat, lon
+        )
+        yield "context", {"store": payload["store"], "coupon": payload["coupon"]}
+
+        if prompt is None:
+            yield "token", payload["reply"]
+            yield "done", {"reply": payload["reply"], "truncated": False}
+            return
+
+        parts: List[str] = []
+        started = time.perf_counter()
+        truncated = False
+        try:
+            async for token in stream_llm(prompt, self.config["llm"]):
+                parts.append(token)
+                yield "token", token
+        except StreamInterrupted as exc:
+            logger.warning("Streamed reply truncated: %s", exc)
+            truncated = True
+
+        reply = "".join(parts)
+        self._record_llm(payload, started, reply)
+        if not truncated:
+            self._remember_reply(cache_key, reply)
+        yield "done", {"reply": reply, "truncated": truncated}
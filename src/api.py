@@ -1,9 +1,17 @@
-from fastapi import FastAPI
-from fastapi.responses import FileResponse
+import json
+import os
+import time
+from typing import List
+
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, JSONResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 
 from .agent import PulseCXAgent
+from .data_loader import rows_to_frame
+from .metrics import CONTENT_TYPE, REQUEST_SECONDS, render, server_timing
 
 app = FastAPI(title="PulseCX Assistant", version="1.0.0")
 
@@ -14,8 +22,49 @@ app.mount("/static", StaticFiles(directory="static"), name="static")
 def serve_ui():
     return FileResponse("static/index.html")
 
-# Initialize agent
-agent = PulseCXAgent("config.yaml")
+# Initialize agent (with startup.mode: background the data and indexes load
+# in a background thread and this returns immediately)
+agent = PulseCXAgent(os.environ.get("PULSECX_CONFIG", "config.yaml"))
+metrics_cfg = agent.config.get("metrics", {})
+trace_header = metrics_cfg.get("trace_header")
+
+
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    if route is not None:
+        REQUEST_SECONDS.observe(time.perf_counter() - started, route=route.path)
+    return response
+
+
+@app.get("/metrics")
+def metrics() -> Response:
+    """
+    Stage latency histograms and counters in the Prometheus text format.
+    """
+    if not metrics_cfg.get("enabled", True):
+        raise HTTPException(status_code=404, detail="Metrics are disabled")
+    return Response(render(), media_type=CONTENT_TYPE)
+
+
+@app.get("/health/live")
+def health_live() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+def health_ready() -> JSONResponse:
+    """
+    200 once data, geo and RAG indexes are built; 503 while warming up.
+    """
+    ready = agent.is_ready()
+    return JSONResponse(
+        {"ready": ready, "components": agent.warmup_status},
+        status_code=200 if ready else 503,
+    )
+
 
 class Location(BaseModel):
     lat: float
@@ -32,11 +81,99 @@ class ChatResponse(BaseModel):
     coupon: dict | None = None
 
 @app.post("/chat", response_model=ChatResponse)
-def chat(request: ChatRequest) -> ChatResponse:
-    result = agent.handle_message(
+async def chat(request: ChatRequest, http_request: Request, response: Response) -> ChatResponse:
+    result = await agent.handle_message_async(
         user_id=request.user_id,
         message=request.message,
         lat=request.location.lat,
         lon=request.location.lon,
     )
+    # Opt-in stage breakdown for this request (metrics.trace_header).
+    if trace_header and http_request.headers.get(trace_header):
+        response.headers["Server-Timing"] = server_timing(result.get("timings", {}))
+        if result.get("degraded"):
+            response.headers["X-PulseCX-Degraded"] = ",".join(result["degraded"])
     return ChatResponse(**result)
+
+
+class BatchChatRequest(BaseModel):
+    requests: List[ChatRequest]
+
+class BatchChatResponse(BaseModel):
+    responses: List[ChatResponse]
+
+@app.post("/chat/batch", response_model=BatchChatResponse)
+async def chat_batch(request: BatchChatRequest) -> BatchChatResponse:
+    max_items = agent.config.get("batch", {}).get("max_items", 1000)
+    if len(request.requests) > max_items:
+        raise HTTPException(status_code=413, detail=f"At most {max_items} requests per batch")
+
+    results = await agent.handle_messages_async([
+        {
+            "user_id": item.user_id,
+            "message": item.message,
+            "lat": item.location.lat,
+            "lon": item.location.lon,
+        }
+        for item in request.requests
+    ])
+    return BatchChatResponse(responses=[ChatResponse(**result) for result in results])
+
+
+@app.post("/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    """
+    Server-sent events: one "context" event (store, coupon), then a "token"
+    event per LLM token, then "done" with the full reply and whether it was
+    truncated by an LLM timeout or error.
+    """
+    async def events():
+        async for event, data in agent.stream_message(
+            user_id=request.user_id,
+            message=request.message,
+            lat=request.location.lat,
+            lon=request.location.lon,
+        ):
+            yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(data))}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+class IngestRequest(BaseModel):
+    customers: List[dict] = []
+    orders: List[dict] = []
+    coupons: List[dict] = []
+
+@app.post("/ingest")
+def ingest(request: IngestRequest) -> dict:
+    """
+    Add or update customers, orders and coupons without a restart.
+
+    Rows with unparseable values (e.g. dates) are rejected with 422.
+    """
+    try:
+        delta = {
+            name: rows_to_frame(name, rows) if rows else None
+            for name, rows in (
+                ("customers", request.customers),
+                ("orders", request.orders),
+                ("coupons", request.coupons),
+            )
+        }
+    except (ValueError, OverflowError) as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid rows: {exc}")
+    try:
+        return agent.ingest(**delta)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=f"Invalid rows: {exc}")
+    except RuntimeError as exc:
+        raise HTTPException(status_code=503, detail=str(exc))
+
+
+@app.get("/stats/cache")
+def cache_stats() -> dict:
+    return agent.cache_stats()
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class MicroBatcher:
+    """
+    Gather concurrent single-item calls into one batched call.
+
+    ``submit`` returns a Future right away. A background thread waits for
+    the first item, keeps collecting for up to ``window_ms`` (or until
+    ``max_batch`` items), then runs ``batch_fn`` once over the whole batch
+    and resolves each Future with its own result. ``batch_fn`` must return
+    one result per input, in order.
+    """
+
+    def __init__(
+        self,
+        batch_fn: Callable[[List[Any]], Sequence[Any]],
+        window_ms: float = 5.0,
+        max_batch: int = 64,
+        name: str = "micro-batcher",
+    ) -> None:
+        self.batch_fn = batch_fn
+        self.window_s = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: "queue.SimpleQueue[Tuple[Any, Future]]" = queue.SimpleQueue()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item: Any) -> Future:
+        future: Future = Future()
+        self._queue.put((item, future))
+        return future
+
+    @property
+    def mean_batch_size(self) -> float:
+        return self.items / self.batches if self.batches else 0.0
+
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window_s
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            # Callers that already gave up (timed-out stages) are skipped.
+            batch = [(item, future) for item, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            self.batches += 1
+            self.items += len(batch)
+            try:
+                results = self.batch_fn([item for item, _ in batch])
+            except Exception as exc:
+                logger.warning("Micro-batch of %d failed: %s", len(batch), exc)
+                for _, future in batch:
+                    future.set_exception(exc)
+                continue
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+import re
+from collections import Counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Lowercased alphanumeric terms, with plural "s" folded ("coupons" -> "coupon").
+    """
+    return [
+        term[:-1] if len(term) > 3 and term.endswith("s") and not term.endswith("ss") else term
+        for term in _TOKEN.findall(text.lower())
+    ]
+
+
+class BM25:
+    """
+    Okapi BM25 over a fixed list of chunks, stored as an inverted index.
+
+    Postings are kept in CSR form: the documents containing term ``t`` are
+    ``doc_ids[indptr[t]:indptr[t + 1]]``, with their precomputed BM25 term
+    weights alongside, so scoring a query is one vectorized add per query
+    term. No model or native library is needed.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: Dict[str, int] = {}
+        self.indptr = np.zeros(1, dtype="int64")
+        self.doc_ids = np.zeros(0, dtype="int32")
+        self.weights = np.zeros(0, dtype="float32")
+        self.n_docs = 0
+
+    def fit(self, chunks: Sequence[str]) -> "BM25":
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        doc_ids: List[int] = []
+        freqs: List[int] = []
+        lengths = np.zeros(len(chunks), dtype="float32")
+
+        for doc_id, chunk in enumerate(chunks):
+            counts = Counter(tokenize(chunk))
+            lengths[doc_id] = sum(counts.values())
+            for term, tf in counts.items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                doc_ids.append(doc_id)
+                freqs.append(tf)
+
+        terms = np.asarray(term_ids, dtype="int64")
+        order = np.argsort(terms, kind="stable")  # group by term, documents stay ascending
+        terms = terms[order]
+        docs = np.asarray(doc_ids, dtype="int32")[order]
+        tf = np.asarray(freqs, dtype="float32")[order]
+
+        n_docs = len(chunks)
+        df = np.bincount(terms, minlength=len(vocabulary))
+        idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype("float32")
+        avg_length = float(lengths.mean()) if n_docs and lengths.mean() > 0 else 1.0
+        norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+
+        self.vocabulary = vocabulary
+        self.indptr = np.concatenate([[0], np.cumsum(df)]).astype("int64")
+        self.doc_ids = docs
+        self.weights = (idf[terms] * tf * (self.k1 + 1) / (tf + norm[docs])).astype("float32")
+        self.n_docs = n_docs
+        return self
+
+    def search(self, query: str, top_k: int = 3) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (chunk ids, scores) of the best top_k chunks sharing a term with the query, best first.
+        """
+        scores = np.zeros(self.n_docs, dtype="float32")
+        for term in set(tokenize(query)):
+            t = self.vocabulary.get(term)
+            if t is not None:
+                start, end = self.indptr[t], self.indptr[t + 1]
+                scores[self.doc_ids[start:end]] += self.weights[start:end]
+
+        matched = np.flatnonzero(scores)
+        if len(matched) > top_k:
+            matched = matched[np.argpartition(-scores[matched], top_k - 1)[:top_k]]
+        best = matched[np.argsort(-scores[matched], kind="stable")]
+        return best, scores[best]
+
+    def stats(self) -> Dict[str, int]:
+        return {"chunks": self.n_docs, "terms": len(self.vocabulary), "postings": int(len(self.doc_ids))}
@@ -0,0 +1,181 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+import numpy as np
+
+_WHITESPACE_REGEX = re.compile(r"\s+")
+
+_MISSING = object()
+
+
+def normalize_text(text: str) -> str:
+    """
+    Canonical form of a short user message for use as a cache key:
+    lower-cased, whitespace collapsed, surrounding punctuation dropped.
+    """
+    return _WHITESPACE_REGEX.sub(" ", text.lower()).strip(" \t\n.!?,;:")
+
+
+class TTLCache:
+    """
+    Thread-safe, size-bounded LRU cache with optional expiry.
+
+    Entries expire ``ttl_s`` seconds after being set (a per-entry TTL can
+    be passed to ``set``); the least recently used entry is evicted once
+    ``max_entries`` is reached. Hits and misses are counted for reporting.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl_s: float | None = None) -> None:
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: OrderedDict[Hashable, tuple[float | None, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None, record: bool = True) -> Any:
+        """
+        Return the live value for key, or default. ``record=False`` skips the hit/miss counters.
+        """
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += record
+                    return value
+                del self._data[key]
+            self.misses += record
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl_s: float | None = None) -> None:
+        ttl_s = self.ttl_s if ttl_s is None else ttl_s
+        expires_at = time.monotonic() + ttl_s if ttl_s is not None else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def pop(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hit_rate, 4),
+        }
+
+
+def fingerprint(obj: Any) -> str:
+    """
+    Stable hash of a JSON-like structure (dict key order does not matter).
+    """
+    payload = json.dumps(obj, sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+# (context fingerprint, normalized message, message embedding or None)
+ResponseKey = Tuple[str, str, Any]
+
+
+class ResponseCache:
+    """
+    Cache of LLM replies keyed on the request context and the message.
+
+    The key is a fingerprint of the context (the caller passes only what a
+    reply depends on, e.g. llm_orchestrator.render_cache_context) plus the
+    normalized (already masked) message. With ``embed_fn`` set, an exact miss may
+    still hit when a cached message for the same context is within
+    ``similarity_threshold`` cosine similarity of the new one.
+    """
+
+    # Messages remembered per context for the similarity check.
+    _MAX_NEIGHBOURS = 32
+
+    def __init__(
+        self,
+        max_entries: int = 2048,
+        ttl_s: float | None = 300,
+        embed_fn: Callable[[List[str]], np.ndarray] | None = None,
+        similarity_threshold: float = 0.92,
+    ) -> None:
+        self.replies = TTLCache(max_entries, ttl_s)
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        self._neighbours = TTLCache(max_entries, ttl_s)
+        self.semantic_hits = 0
+
+    def lookup(self, context: Any, message: str) -> Tuple[ResponseKey, str | None]:
+        """
+        Return (key, cached reply or None). Pass the key to ``store`` on a miss.
+        """
+        context_fp = fingerprint(context)
+        normalized = normalize_text(message)
+
+        reply = self.replies.get((context_fp, normalized))
+        if reply is not None or self.embed_fn is None:
+            return (context_fp, normalized, None), reply
+
+        embedding = _unit(np.asarray(self.embed_fn([normalized]), dtype="float32")[0])
+        neighbours = self._neighbours.get(context_fp, record=False) or []
+        for other, other_emb in neighbours:
+            if float(np.dot(embedding, other_emb)) >= self.similarity_threshold:
+                reply = self.replies.get((context_fp, other), record=False)
+                if reply is not None:
+                    self.semantic_hits += 1
+                    break
+
+        return (context_fp, normalized, embedding), reply
+
+    def store(self, key: ResponseKey, reply: str) -> None:
+        context_fp, normalized, embedding = key
+        self.replies.set((context_fp, normalized), reply)
+
+        if embedding is not None:
+            neighbours = self._neighbours.get(context_fp, record=False) or []
+            neighbours = [n for n in neighbours if n[0] != normalized]
+            neighbours.append((normalized, embedding))
+            self._neighbours.set(context_fp, neighbours[-self._MAX_NEIGHBOURS:])
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.replies.stats()
+        # The exact-match lookup counted semantic hits as misses.
+        stats["semantic_hits"] = self.semantic_hits
+        stats["hits"] += self.semantic_hits
+        stats["misses"] -= self.semantic_hits
+        total = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = round(stats["hits"] / total, 4) if total else 0.0
+        return stats
+
+
+def _unit(vector: np.ndarray) -> np.ndarray:
+    norm = float(np.linalg.norm(vector))
+    return vector / norm if norm else vector
@@ -1,38 +1,272 @@
+import copy
+import io
+import logging
+import os
+import time
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Any, Tuple, List
+from typing import Dict, Any, Callable, Tuple, List
 
+import numpy as np
 import pandas as pd
 from dateutil import parser as date_parser
 
+try:
+    import pyarrow as pa
+    from pyarrow import feather
+except ImportError:  # snapshot cache is skipped if pyarrow is missing
+    pa = None
+    feather = None
 
-def _read_csv(path: str | Path) -> pd.DataFrame:
+logger = logging.getLogger(__name__)
+
+# Low-cardinality string columns are loaded as categoricals: one small code
+# array per column instead of a Python string object per row.
+_CSV_DTYPES: Dict[str, Dict[str, str]] = {
+    "customers": {"city": "category", "loyalty_tier": "category"},
+    "orders": {"store_id": "category", "status": "category", "item": "category"},
+    "stores": {"city": "category"},
+    "coupons": {"store_id": "category"},
+}
+
+# Known timestamp layouts written by scripts/generate_data.py. Rows that do
+# not match fall back to dateutil.
+_DATE_FORMATS: Dict[str, Dict[str, str]] = {
+    "orders": {"created_at": "%Y-%m-%d %H:%M:%S"},
+    "coupons": {"expiry_date": "%Y-%m-%d"},
+}
+
+# Bump when dtypes or parsing change so stale snapshots are not reused.
+_SNAPSHOT_VERSION = 1
+
+# Table files in Arrow IPC (Feather v2) format, loaded without a CSV parse.
+_ARROW_SUFFIXES = (".arrow", ".feather")
+
+
+def _read_csv(path: str | Path, dtype: Dict[str, str] | None = None) -> pd.DataFrame:
     path = Path(path)
     if not path.exists():
         raise FileNotFoundError(f"Expected CSV not found at {path}")
-    return pd.read_csv(path)
+    return pd.read_csv(path, dtype=dtype)
+
+
+def _parse_datetimes(values: pd.Series, fmt: str) -> pd.Series:
+    """
+    Vectorized datetime parsing with a known format.
+
+    Only rows that fail the fast path are handed to dateutil, one at a time.
+    Values with an offset ("2031-01-01T10:00:00Z") become naive UTC, like
+    every other timestamp in the tables.
+    """
+    parsed = pd.to_datetime(values, format=fmt, errors="coerce")
+    failed = parsed.isna() & values.notna()
+    if failed.any():
+        logger.info("Falling back to dateutil for %d rows of %s", int(failed.sum()), values.name)
+        parsed = parsed.astype(object)
+        parsed.loc[failed] = values.loc[failed].map(_parse_naive_utc)
+        parsed = pd.to_datetime(parsed)
+    return parsed
+
+
+def _parse_naive_utc(value: Any) -> datetime:
+    parsed = date_parser.parse(str(value))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def _parse_table_dates(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    for column, fmt in _DATE_FORMATS.get(name, {}).items():
+        if column in df.columns:
+            df[column] = _parse_datetimes(df[column], fmt)
+    return df
+
+
+def _load_table(name: str, path: str | Path) -> pd.DataFrame:
+    return _parse_table_dates(name, _read_csv(path, dtype=_CSV_DTYPES.get(name)))
+
+
+def rows_to_frame(name: str, rows: List[Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Build a table delta from raw rows (e.g. an ingestion request), parsing
+    date columns the same way as the CSV loader.
+
+    Raises ValueError for rows that cannot be parsed.
+    """
+    return _check_delta(name, _parse_table_dates(name, pd.DataFrame(rows)))
+
+
+# Upsert key and grouping key of each ingestible table.
+_DELTA_KEYS: Dict[str, Tuple[str, ...]] = {
+    "customers": ("customer_id",),
+    "orders": ("order_id", "customer_id"),
+    "coupons": ("coupon_id", "customer_id"),
+}
+
+
+def _check_delta(name: str, df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Reject a delta that would break lookups once merged: missing keys, or
+    date columns that are not naive datetimes like the loaded tables.
+    """
+    for column in _DELTA_KEYS.get(name, ()):
+        if column not in df.columns or df[column].isna().any():
+            raise ValueError(f"{name} rows need a {column}")
+    for column in _DATE_FORMATS.get(name, {}):
+        if column in df.columns and not (
+            pd.api.types.is_datetime64_dtype(df[column]) and getattr(df[column].dtype, "tz", None) is None
+        ):
+            raise ValueError(f"{name}.{column} must hold naive datetimes, got {df[column].dtype}")
+    return df
+
+
+class FileShrunk(RuntimeError):
+    """
+    A tailed file got smaller (rewritten or rotated), so appended rows can
+    no longer be followed from the saved offset.
+    """
+
+
+class CsvTailer:
+    """
+    Follow a CSV that only grows by appended rows.
+
+    The tailer starts at the file's current end; each ``read_new`` call
+    returns the complete rows appended since the last ``commit`` (a
+    trailing partial line is left for next time), parsed like the initial
+    load. Until the caller commits, the same rows are returned again, so
+    rows whose ingestion failed are not lost.
+    """
+
+    def __init__(self, name: str, path: str | Path) -> None:
+        self.name = name
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            self.header = f.readline()
+        self.offset = self.path.stat().st_size
+        # End of the rows returned by the last read_new, and their raw text.
+        self.pending_offset = self.offset
+        self.pending_rows = b""
+
+    def read_new(self) -> pd.DataFrame | None:
+        """
+        Return rows appended since the last commit, or None if there are none.
+
+        Raises FileShrunk if the file shrank (rewritten or rotated); the
+        caller must fall back to a full reload. Raises ValueError if the
+        rows cannot be parsed; commit() then skips them.
+        """
+        size = self.path.stat().st_size
+        if size < self.offset:
+            raise FileShrunk(f"{self.path} shrank from {self.offset} to {size} bytes")
+        self.pending_offset, self.pending_rows = self.offset, b""
+        if size == self.offset:
+            return None
+
+        with self.path.open("rb") as f:
+            f.seek(self.offset)
+            data = f.read(size - self.offset)
+
+        end = data.rfind(b"\n")
+        if end < 0:
+            return None
+        self.pending_offset = self.offset + end + 1
+        self.pending_rows = data[:end + 1]
+
+        df = pd.read_csv(io.BytesIO(self.header + self.pending_rows), dtype=_CSV_DTYPES.get(self.name))
+        return _parse_table_dates(self.name, df)
+
+    def commit(self) -> None:
+        """
+        Move past the rows returned by the last read_new.
+        """
+        self.offset = self.pending_offset
+
+
+def _snapshot_path(snapshot_dir: Path, name: str, csv_path: str | Path) -> Path:
+    """
+    Snapshot file for a CSV, keyed by the CSV's size and mtime.
+    """
+    stat = Path(csv_path).stat()
+    return snapshot_dir / f"{name}-{stat.st_size}-{stat.st_mtime_ns}-v{_SNAPSHOT_VERSION}.arrow"
+
+
+def _read_snapshot(path: Path) -> pd.DataFrame:
+    """
+    Memory-map an Arrow IPC snapshot.
+
+    Numeric and datetime columns stay backed by the mapped file, so workers
+    on the same host share those pages through the OS page cache.
+    """
+    with pa.memory_map(str(path), "r") as source:
+        table = pa.ipc.open_file(source).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def _write_snapshot(df: pd.DataFrame, path: Path, name: str) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    try:
+        feather.write_feather(df, tmp_path, compression="uncompressed")
+        os.replace(tmp_path, path)
+    except Exception as exc:
+        logger.warning("Failed to write snapshot %s: %s", path, exc)
+        tmp_path.unlink(missing_ok=True)
+        return
+
+    for stale in path.parent.glob(f"{name}-*.arrow"):
+        if stale != path:
+            stale.unlink(missing_ok=True)
+
+
+def _load_table_cached(name: str, path: str | Path, snapshot_dir: str | Path | None) -> pd.DataFrame:
+    """
+    Load one table, preferring a binary snapshot when one matches the CSV.
+
+    Paths ending in .arrow / .feather (e.g. from scripts/generate_data.py
+    --format arrow) are memory-mapped directly.
+    """
+    start = time.perf_counter()
+    source = "csv"
+
+    if Path(path).suffix in _ARROW_SUFFIXES:
+        if feather is None:
+            raise RuntimeError(f"pyarrow is required to load {path}")
+        df = _read_snapshot(Path(path))
+        source = "arrow"
+    elif snapshot_dir is None or feather is None:
+        df = _load_table(name, path)
+    else:
+        snap_path = _snapshot_path(Path(snapshot_dir), name, path)
+        if snap_path.exists():
+            df = _read_snapshot(snap_path)
+            source = "snapshot"
+        else:
+            df = _load_table(name, path)
+            _write_snapshot(df, snap_path, name)
+
+    elapsed = time.perf_counter() - start
+    memory_mb = df.memory_usage(deep=True).sum() / 1e6
+    logger.info("Loaded %s from %s: %d rows in %.3fs, %.1f MB", name, source, len(df), elapsed, memory_mb)
+    return df
 
 
 def load_all_data(cfg: Dict[str, Any]) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, pd.DataFrame]:
     """
     Load all core datasets: customers, orders, stores, coupons.
+
+    If ``data.snapshot_dir`` is configured (and pyarrow is installed), each
+    CSV is parsed once and cached as an uncompressed Arrow file; later loads
+    memory-map that file instead of re-parsing the CSV. Tables configured
+    as .arrow files are memory-mapped as-is.
     """
     data_cfg = cfg["data"]
+    snapshot_dir = data_cfg.get("snapshot_dir")
 
-    customers = _read_csv(data_cfg["customers"])
-    orders = _read_csv(data_cfg["orders"])
-    stores = _read_csv(data_cfg["stores"])
-    coupons = _read_csv(data_cfg["coupons"])
-
-    # parse datetimes for orders & coupon expiry if present
-    if "created_at" in orders.columns:
-        orders["created_at"] = orders["created_at"].apply(
-            lambda x: date_parser.parse(str(x)) if pd.notna(x) else pd.NaT
-        )
-
-    if "expiry_date" in coupons.columns:
-        coupons["expiry_date"] = coupons["expiry_date"].apply(
-            lambda x: date_parser.parse(str(x)) if pd.notna(x) else pd.NaT
-        )
+    customers = _load_table_cached("customers", data_cfg["customers"], snapshot_dir)
+    orders = _load_table_cached("orders", data_cfg["orders"], snapshot_dir)
+    stores = _load_table_cached("stores", data_cfg["stores"], snapshot_dir)
+    coupons = _load_table_cached("coupons", data_cfg["coupons"], snapshot_dir)
 
     return customers, orders, stores, coupons
 
@@ -70,3 +304,320 @@ def get_active_coupons(coupons: pd.DataFrame, user_id: str) -> List[Dict[str, An
         df = df.loc[(df["expiry_date"].isna()) | (df["expiry_date"] >= pd.Timestamp.utcnow())]
 
     return df.to_dict(orient="records")
+
+
+def _utcnow() -> pd.Timestamp:
+    """
+    Current UTC time as a naive Timestamp, comparable with parsed CSV dates.
+    """
+    return pd.Timestamp.now(tz="UTC").tz_localize(None)
+
+
+
+
+# Per-customer tables, in the row order of the offsets array.
+CUSTOMER_TABLES = ("customers", "orders", "coupons")
+
+
+def _group_by_customer(df: pd.DataFrame, keys: pd.Index) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Rows reordered so each customer's rows are contiguous (keeping their
+    relative order), and CSR offsets: customer ``keys[i]`` owns rows
+    ``offsets[i]:offsets[i + 1]``.
+    """
+    positions = keys.get_indexer(df["customer_id"].astype(str))
+    order = np.argsort(positions, kind="stable")
+    counts = np.bincount(positions, minlength=len(keys))
+    offsets = np.concatenate([[0], np.cumsum(counts)]).astype("int64")
+    return df.iloc[order].reset_index(drop=True), offsets
+
+
+def _row_indices(offsets: np.ndarray, positions: List[int | None]) -> np.ndarray:
+    """
+    Row numbers owned by the customers at ``positions`` (None = unknown customer).
+    """
+    ranges = [np.arange(offsets[p], offsets[p + 1]) for p in positions if p is not None]
+    return np.concatenate(ranges) if ranges else np.empty(0, dtype="int64")
+
+
+def _column_reader(array: "pa.Array") -> Callable[[int], Any]:
+    """
+    Function returning the Python value at row ``i``, read straight from
+    the array's (memory-mapped) buffers through NumPy views.
+
+    Much cheaper than slicing + to_pylist for the few rows a lookup needs.
+    Types without a fast path fall back to ``array[i].as_py()``.
+    """
+    t = array.type
+    start, length = array.offset, len(array)
+
+    if pa.types.is_dictionary(t):
+        codes = _column_reader(array.indices)
+        values = array.dictionary.to_pylist()
+        return lambda i: None if (code := codes(i)) is None else values[code]
+
+    buffers = array.buffers()
+    if pa.types.is_string(t) or pa.types.is_large_string(t):
+        width = "int64" if pa.types.is_large_string(t) else "int32"
+        offsets = np.frombuffer(buffers[1], dtype=width)[start : start + length + 1]
+        data = memoryview(buffers[2]) if buffers[2] is not None else memoryview(b"")
+        read = lambda i: str(data[offsets[i] : offsets[i + 1]], "utf-8")  # noqa: E731
+    elif pa.types.is_timestamp(t) and t.tz is None:
+        stamps = np.frombuffer(buffers[1], dtype="int64")[start : start + length]
+        unit = t.unit
+        read = lambda i: pd.Timestamp(int(stamps[i]), unit=unit)  # noqa: E731
+    elif pa.types.is_integer(t) or pa.types.is_floating(t):
+        values = np.frombuffer(buffers[1], dtype=t.to_pandas_dtype())[start : start + length]
+        read = values.item
+    else:
+        return lambda i: array[i].as_py()
+
+    if array.null_count == 0:
+        return read
+    validity = np.frombuffer(buffers[0], dtype="uint8")
+    return lambda i: read(i) if validity[(i + start) >> 3] >> ((i + start) & 7) & 1 else None
+
+
+def _series_reader(values: pd.Series) -> Callable[[int], Any]:
+    """
+    Function returning the Python value at row ``i`` of a column, without
+    converting the rest of the column to Python objects.
+    """
+    dtype = values.dtype
+    if isinstance(dtype, pd.CategoricalDtype):
+        codes = values.cat.codes.to_numpy()
+        categories = values.cat.categories.to_list()
+        return lambda i: None if (code := codes.item(i)) < 0 else categories[code]
+    if pa is not None and isinstance(dtype, pd.StringDtype) and dtype.storage == "pyarrow":
+        array = pa.array(values)
+        if isinstance(array, pa.ChunkedArray):
+            array = array.combine_chunks()
+        return _column_reader(array)
+
+    array = values.to_numpy()
+    if array.dtype.kind == "M":
+        return lambda i: pd.Timestamp(array[i])
+    if array.dtype.kind in "biuf":
+        return array.item
+    return lambda i: array[i]
+
+
+class ColumnStore:
+    """
+    The per-customer tables held column-wise, in the layout of a published
+    shared-data generation (src/shared_data.py): rows grouped by customer,
+    ``keys`` sorted, and customer ``keys[i]`` owning rows
+    ``offsets[t, i]:offsets[t, i + 1]`` of table ``CUSTOMER_TABLES[t]``.
+
+    Lookups binary-search the keys and build dicts only for the rows they return.
+    """
+
+    def __init__(self, tables: Dict[str, pd.DataFrame]) -> None:
+        # Tables not given (e.g. in a delta) are empty.
+        frames = [
+            tables.get(name, pd.DataFrame({"customer_id": pd.Series(dtype=str)})) for name in CUSTOMER_TABLES
+        ]
+        ids = pd.concat([df["customer_id"] for df in frames]).astype(str)
+        keys = pd.Index(np.sort(ids.unique()))
+
+        self.tables: Dict[str, pd.DataFrame] = {}
+        offsets = []
+        for name, df in zip(CUSTOMER_TABLES, frames):
+            self.tables[name], table_offsets = _group_by_customer(df, keys)
+            offsets.append(table_offsets)
+        self.keys = keys.to_numpy(dtype=str)
+        self.offsets = np.stack(offsets)
+        self._readers = {
+            name: [(column, _series_reader(df[column])) for column in df.columns]
+            for name, df in self.tables.items()
+        }
+
+    def position(self, user_id: str) -> int | None:
+        """
+        Row of ``user_id`` in the key array, or None if unknown.
+        """
+        i = int(self.keys.searchsorted(user_id))
+        if i < len(self.keys) and self.keys[i] == user_id:
+            return i
+        return None
+
+    def rows(self, table: str, position: int, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        A customer's rows from ``table`` as dicts.
+        """
+        t = CUSTOMER_TABLES.index(table)
+        start, end = int(self.offsets[t, position]), int(self.offsets[t, position + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        readers = self._readers[table]
+        return [{column: read(i) for column, read in readers} for i in range(start, end)]
+
+    def take(self, table: str, user_ids: List[str]) -> pd.DataFrame:
+        """
+        All rows of the given customers from ``table``, as a DataFrame.
+        """
+        positions = [self.position(user_id) for user_id in user_ids]
+        return self.tables[table].iloc[_row_indices(self.offsets[CUSTOMER_TABLES.index(table)], positions)]
+
+
+class CustomerIndex:
+    """
+    Prebuilt in-memory lookup tables keyed by customer_id.
+
+    Built once at startup: the tables are regrouped column-wise by customer
+    (a ColumnStore), so a per-request lookup is a binary search plus dicts
+    for the rows it returns, instead of a boolean-mask scan (and, for
+    orders, a full re-sort) over the whole DataFrame.
+
+    An index is never mutated after construction. ``apply_delta`` returns
+    a new index that the caller swaps in with a single assignment, so
+    readers holding the old index are never blocked or see a half-applied
+    update.
+
+    ``generation`` identifies the snapshot. ``modified`` records the
+    generation at which each customer last changed, so caches can tell
+    with ``is_current`` whether an entry built from an older snapshot is
+    still valid for that customer.
+    """
+
+    def __init__(
+        self,
+        customers: pd.DataFrame,
+        orders: pd.DataFrame,
+        coupons: pd.DataFrame,
+        generation: int = 0,
+    ) -> None:
+        customers = customers.dropna(subset=["customer_id"]).drop_duplicates("customer_id")
+        orders = orders.dropna(subset=["customer_id"])
+        coupons = coupons.dropna(subset=["customer_id"])
+        # Orders are sorted once, most recent first, so each customer's rows
+        # are already in the order get_recent_orders returns.
+        if "created_at" in orders.columns:
+            orders = orders.sort_values("created_at", ascending=False, kind="mergesort")
+
+        self.store = ColumnStore({"customers": customers, "orders": orders, "coupons": coupons})
+        self.generation = generation
+        self.base_generation = generation
+        self.modified: Dict[str, int] = {}
+        # Customers changed by apply_delta, per table: customer_id -> the
+        # (small) ColumnStore holding that customer's merged rows.
+        self.overlay: Dict[str, Dict[str, ColumnStore]] = {name: {} for name in CUSTOMER_TABLES}
+
+    def is_current(self, user_id: str, generation: int) -> bool:
+        """
+        True if data built from snapshot ``generation`` is still valid for user_id.
+        """
+        return generation >= self.modified.get(user_id, self.base_generation)
+
+    def apply_delta(
+        self,
+        customers: pd.DataFrame | None = None,
+        orders: pd.DataFrame | None = None,
+        coupons: pd.DataFrame | None = None,
+    ) -> "CustomerIndex":
+        """
+        Return a new index with the given rows added.
+
+        Customers are upserted by customer_id, orders by order_id and coupons
+        by coupon_id, so re-applying the same rows is harmless. New orders
+        are merged into each customer's rows in created_at order.
+
+        The touched customers' current rows are merged with the delta into
+        one new ColumnStore, which the new index's overlay points them at;
+        the base store is shared. Cost is proportional to the delta plus a
+        shallow copy of each touched table's overlay dict.
+        """
+        # Validate everything before building the new index, so a bad delta
+        # leaves the current one untouched.
+        for name, df in (("customers", customers), ("orders", orders), ("coupons", coupons)):
+            if df is not None and len(df):
+                _check_delta(name, df)
+
+        merged = {
+            name: self._merged_rows(name, df)
+            for name, df in (("customers", customers), ("orders", orders), ("coupons", coupons))
+            if df is not None and len(df)
+        }
+        new = copy.copy(self)
+        new.generation = self.generation + 1
+        new.modified = dict(self.modified)
+        new.overlay = dict(self.overlay)
+        if not merged:
+            return new
+
+        block = ColumnStore(merged)
+        for name, df in merged.items():
+            new.overlay[name] = dict(self.overlay[name])
+            for customer_id in df["customer_id"].astype(str).unique():
+                new.overlay[name][customer_id] = block
+                new.modified[customer_id] = new.generation
+        return new
+
+    def _store_for(self, table: str, user_id: str) -> Any:
+        return self.overlay[table].get(user_id, self.store)
+
+    def _merged_rows(self, table: str, delta: pd.DataFrame) -> pd.DataFrame:
+        """
+        Current rows of the customers in ``delta`` with the delta upserted
+        by the table's key, in lookup order.
+        """
+        by_store: Dict[int, Tuple[Any, List[str]]] = {}
+        for user_id in delta["customer_id"].astype(str).unique():
+            store = self._store_for(table, user_id)
+            by_store.setdefault(id(store), (store, []))[1].append(user_id)
+        current = [store.take(table, user_ids) for store, user_ids in by_store.values()]
+        current = [df for df in current if len(df)]
+
+        key = _DELTA_KEYS[table][0]
+        if table == "orders":
+            # Delta rows win, and come first among orders with the same created_at.
+            rows = pd.concat([delta] + current, ignore_index=True)
+            keep = "first"
+        else:
+            # Existing rows keep their place; new ones are appended.
+            rows = pd.concat(current + [delta], ignore_index=True)
+            keep = "last"
+        # Rows without a key never replace each other.
+        rows = rows.loc[~(rows.duplicated(key, keep=keep) & rows[key].notna())]
+        if table == "orders" and "created_at" in rows.columns:
+            rows = rows.sort_values("created_at", ascending=False, kind="mergesort")
+        return rows
+
+    def _rows(self, table: str, user_id: str, n: int | None = None) -> List[Dict[str, Any]]:
+        store = self._store_for(table, user_id)
+        position = store.position(user_id)
+        return [] if position is None else store.rows(table, position, n)
+
+    def get_customer(self, user_id: str) -> Dict[str, Any] | None:
+        """
+        Look up a single customer by ID.
+        """
+        rows = self._rows("customers", user_id, 1)
+        return rows[0] if rows else None
+
+    def get_recent_orders(self, user_id: str, n: int = 3) -> List[Dict[str, Any]]:
+        """
+        Return last N orders for a customer, most recent first.
+        """
+        return self._rows("orders", user_id, n)
+
+    def get_active_coupons(self, user_id: str) -> List[Dict[str, Any]]:
+        """
+        Fetch non-expired coupons for a customer, if expiry_date exists.
+        """
+        now = _utcnow()
+        return [
+            record
+            for record in self._rows("coupons", user_id)
+            if pd.isna(record.get("expiry_date")) or record["expiry_date"] >= now
+        ]
+
+    @staticmethod
+    def seconds_until_first_expiry(coupons: List[Dict[str, Any]]) -> float | None:
+        """
+        Seconds until the earliest expiry_date among the given coupons, if any.
+        """
+        expiries = [c["expiry_date"] for c in coupons if not pd.isna(c.get("expiry_date"))]
+        if not expiries:
+            return None
+        return max(0.0, (min(expiries) - _utcnow()).total_seconds())
@@ -1,10 +1,21 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import math
+
+import numpy as np
 import pandas as pd
 
+# scipy.spatial takes ~0.4 s to import, so it is imported when the first
+# StoreIndex is built rather than with this module; see _import_kd_tree.
+cKDTree = None
+
+EARTH_RADIUS_M = 6371000
+
+HOURS_PER_WEEK = 7 * 24
+_WEEKDAYS = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
 
 def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000  # meters
+    R = EARTH_RADIUS_M  # meters
     phi1, phi2 = math.radians(lat1), math.radians(lat2)
     dphi = math.radians(lat2 - lat1)
     dlambda = math.radians(lon2 - lon1)
@@ -17,6 +28,22 @@ def haversine(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
     return R * c
 
 
+def haversine_np(lat1: Any, lon1: Any, lat2: Any, lon2: Any) -> np.ndarray:
+    """
+    Vectorized haversine distance in meters.
+
+    Accepts scalars or arrays (degrees) and broadcasts them with NumPy rules,
+    e.g. one point against every store, or N points against N stores.
+    """
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlambda = np.radians(np.subtract(lon2, lon1))
+
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlambda / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_M * c
+
+
 def find_nearest_open_store(
     stores: pd.DataFrame,
     lat: float,
@@ -31,22 +58,246 @@ def find_nearest_open_store(
         return None
 
     # All stores, compute distance
-    stores = stores.copy()
-    stores["distance_m"] = stores.apply(
-        lambda r: haversine(lat, lon, float(r["lat"]), float(r["lon"])),
-        axis=1,
+    distance_m = haversine_np(
+        lat, lon, stores["lat"].to_numpy(dtype=float), stores["lon"].to_numpy(dtype=float)
     )
 
     # Filter open stores
-    open_stores = stores[
+    is_open = (
         (stores["open_hour"] <= current_hour) & (stores["close_hour"] >= current_hour)
-    ]
+    ).to_numpy()
+
+    # Nearest open store if any is open, else nearest store overall
+    candidates = np.flatnonzero(is_open) if is_open.any() else np.arange(len(stores))
+    best = int(candidates[np.argmin(distance_m[candidates])])
+
+    record = stores.iloc[best].to_dict()
+    record["distance_m"] = float(distance_m[best])
+    return record
+
+
+def find_nearest_open_stores(
+    stores: "pd.DataFrame | StoreIndex",
+    lats: Any,
+    lons: Any,
+    hours: Any,
+    weekdays: Any = 0,
+) -> List[Optional[Dict[str, Any]]]:
+    """
+    Batch version of find_nearest_open_store for N user locations.
+
+    ``hours`` (and ``weekdays``, 0 = Monday) may be scalars or one per
+    location. Pass a prebuilt StoreIndex to avoid rebuilding it on every call.
+    """
+    index = stores if isinstance(stores, StoreIndex) else StoreIndex(stores)
+    return index.nearest_open_stores(lats, lons, hours, weekdays)
+
+
+def _day_hours(stores: pd.DataFrame, column: str, day: str) -> np.ndarray:
+    """
+    Per-store hour for one weekday: ``<column>_<day>`` if present, else ``<column>``.
+    """
+    values = stores[column].to_numpy(dtype=float)
+    day_column = f"{column}_{day}"
+    if day_column in stores.columns:
+        override = stores[day_column].to_numpy(dtype=float)
+        values = np.where(np.isnan(override), values, override)
+    return values
+
+
+def build_open_hours_bitmap(stores: pd.DataFrame) -> np.ndarray:
+    """
+    Pack each store's weekly opening hours into a 168-bit bitmap.
+
+    Returns an (n_stores, 21) uint8 array; bit ``weekday * 24 + hour``
+    (weekday 0 = Monday) is set when the store is open during that hour.
+    Hours are inclusive, as in ``open_hour <= h <= close_hour``. A
+    close_hour earlier than open_hour means the store closes after
+    midnight, and close_hour 24 means open until midnight. Optional per-day
+    columns such as ``open_hour_fri`` / ``close_hour_fri`` override the
+    defaults for that day.
+    """
+    hours = np.arange(24)
+    week = np.zeros((len(stores), HOURS_PER_WEEK), dtype=bool)
+
+    for day, name in enumerate(_WEEKDAYS):
+        open_h = _day_hours(stores, "open_hour", name)[:, None]
+        close_h = _day_hours(stores, "close_hour", name)[:, None]
+        known = ~(np.isnan(open_h) | np.isnan(close_h))
+        overnight = known & (close_h < open_h)
+
+        today = np.where(overnight, hours >= open_h, (open_h <= hours) & (hours <= close_h))
+        week[:, day * 24:(day + 1) * 24] |= today & known
+
+        next_day = (day + 1) % 7
+        week[:, next_day * 24:(next_day + 1) * 24] |= overnight & (hours <= close_h)
+
+    return np.packbits(week, axis=1)
+
+
+def _import_kd_tree() -> bool:
+    """
+    Import scipy's cKDTree on first use. False if scipy is missing.
+    """
+    global cKDTree
+    if cKDTree is None:
+        try:
+            from scipy.spatial import cKDTree as tree_cls
+        except ImportError:  # StoreIndex falls back to a vectorized brute-force scan
+            return False
+        cKDTree = tree_cls
+    return True
+
+
+def _to_unit_xyz(lat: Any, lon: Any) -> np.ndarray:
+    """
+    Project lat/lon (degrees) onto the unit sphere as (..., 3) xyz points.
+    """
+    phi = np.radians(np.asarray(lat, dtype=float))
+    lam = np.radians(np.asarray(lon, dtype=float))
+    cos_phi = np.cos(phi)
+    return np.stack([cos_phi * np.cos(lam), cos_phi * np.sin(lam), np.sin(phi)], axis=-1)
+
+
+class StoreIndex:
+    """
+    Spatial index over stores, built once at startup.
+
+    Stores are placed on the unit sphere, where straight-line (chord)
+    distance orders points exactly like great-circle distance, so a KD-tree
+    answers k-nearest queries in O(log n). Candidates are then re-ranked
+    with the exact haversine distance.
+    """
+
+    # Rows per block when brute-forcing many points without scipy.
+    _BRUTE_FORCE_BLOCK = 1024
+
+    def __init__(self, stores: pd.DataFrame) -> None:
+        self.records: List[Dict[str, Any]] = stores.to_dict(orient="records")
+        self.lat = stores["lat"].to_numpy(dtype=float)
+        self.lon = stores["lon"].to_numpy(dtype=float)
+        self.open_bits = build_open_hours_bitmap(stores)
+        # Hours of the week at which at least one store is open.
+        self._any_open = np.unpackbits(np.bitwise_or.reduce(self.open_bits, axis=0))
+
+        self._xyz = _to_unit_xyz(self.lat, self.lon)
+        self._tree = cKDTree(self._xyz) if len(self) and _import_kd_tree() else None
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def _candidates(self, points: np.ndarray, k: int) -> np.ndarray:
+        """
+        Indices of the k stores closest to each (n, 3) point, closest first.
+
+        Returns an (n, k) array.
+        """
+        k = min(k, len(self))
+        if self._tree is not None:
+            _, idx = self._tree.query(points, k=k)
+            return np.asarray(idx).reshape(len(points), k)
+
+        blocks = []
+        for start in range(0, len(points), self._BRUTE_FORCE_BLOCK):
+            block = points[start:start + self._BRUTE_FORCE_BLOCK]
+            chord2 = ((block[:, None, :] - self._xyz[None, :, :]) ** 2).sum(axis=2)
+            if k < len(self):
+                idx = np.argpartition(chord2, k - 1, axis=1)[:, :k]
+            else:
+                idx = np.broadcast_to(np.arange(len(self)), chord2.shape)
+            order = np.argsort(np.take_along_axis(chord2, idx, axis=1), axis=1, kind="stable")
+            blocks.append(np.take_along_axis(idx, order, axis=1))
+        return np.concatenate(blocks) if blocks else np.empty((0, k), dtype=np.intp)
+
+    def _is_open(self, idx: np.ndarray, hour_of_week: Any) -> np.ndarray:
+        """
+        One bit test per candidate store; ``hour_of_week`` broadcasts against ``idx``.
+        """
+        byte = self.open_bits[idx, hour_of_week >> 3]
+        return ((byte >> (7 - (hour_of_week & 7))) & 1).astype(bool)
+
+    def _record(self, i: int, distance_m: float) -> Dict[str, Any]:
+        record = dict(self.records[i])
+        record["distance_m"] = float(distance_m)
+        return record
+
+    def nearest_open(
+        self, lat: float, lon: float, hour: int, k: int = 1, weekday: int = 0
+    ) -> List[Dict[str, Any]]:
+        """
+        Return up to k stores open at the given hour, nearest first.
+
+        ``weekday`` (0 = Monday) only matters for stores with per-day
+        schedules or hours that cross midnight.
+        """
+        hour_of_week = weekday * 24 + hour
+        if not len(self) or not self._any_open[hour_of_week]:
+            return []
+
+        point = _to_unit_xyz([lat], [lon])
+
+        # Widen the candidate set until enough of them are open.
+        fetch = min(len(self), max(8, 4 * k))
+        while True:
+            idx = self._candidates(point, fetch)[0]
+            open_idx = idx[self._is_open(idx, hour_of_week)]
+            if len(open_idx) >= k or fetch >= len(self):
+                break
+            fetch = min(len(self), fetch * 4)
+
+        open_idx = open_idx[:k]
+        distances = haversine_np(lat, lon, self.lat[open_idx], self.lon[open_idx])
+        order = np.argsort(distances, kind="stable")
+        return [self._record(int(open_idx[j]), distances[j]) for j in order]
+
+    def nearest_open_store(
+        self, lat: float, lon: float, current_hour: int, weekday: int = 0
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Return nearest open store; if none open, return nearest store overall.
+        """
+        if not len(self):
+            return None
+
+        found = self.nearest_open(lat, lon, current_hour, k=1, weekday=weekday)
+        if found:
+            return found[0]
+
+        i = int(self._candidates(_to_unit_xyz([lat], [lon]), 1)[0, 0])
+        return self._record(i, haversine(lat, lon, float(self.lat[i]), float(self.lon[i])))
+
+    def nearest_open_stores(
+        self, lats: Any, lons: Any, hours: Any, weekdays: Any = 0
+    ) -> List[Optional[Dict[str, Any]]]:
+        """
+        Nearest open store for each of N locations in one vectorized pass.
+
+        Same fallback as nearest_open_store: a location with no open store
+        nearby gets the nearest store overall.
+        """
+        lats = np.asarray(lats, dtype=float).ravel()
+        lons = np.asarray(lons, dtype=float).ravel()
+        hours = np.broadcast_to(np.asarray(hours, dtype=np.intp), lats.shape)
+        weekdays = np.broadcast_to(np.asarray(weekdays, dtype=np.intp), lats.shape)
+        if not len(self):
+            return [None] * len(lats)
 
-    # If at least one store is open, pick nearest open store
-    if not open_stores.empty:
-        best = open_stores.sort_values("distance_m").iloc[0]
-        return best.to_dict()
+        hours_of_week = weekdays * 24 + hours
+        idx = self._candidates(_to_unit_xyz(lats, lons), min(len(self), 8))
+        is_open = self._is_open(idx, hours_of_week[:, None])
+        # argmax picks the first open candidate, or the nearest store overall
+        # when none is open; the latter is final only if nothing is open anywhere.
+        best = idx[np.arange(len(lats)), is_open.argmax(axis=1)]
+        resolved = is_open.any(axis=1) | ~self._any_open[hours_of_week].astype(bool)
+        distances = haversine_np(lats, lons, self.lat[best], self.lon[best])
 
-    # If NO store is open → return nearest store overall
-    best_any = stores.sort_values("distance_m").iloc[0]
-    return best_any.to_dict()
+        results: List[Optional[Dict[str, Any]]] = []
+        for row, i in enumerate(best):
+            if resolved[row]:
+                results.append(self._record(int(i), distances[row]))
+            else:
+                # Rare: no open store among the first candidates, widen per row.
+                results.append(self.nearest_open_store(
+                    lats[row], lons[row], int(hours[row]), weekday=int(weekdays[row])
+                ))
+        return results
@@ -1,7 +1,19 @@
-from typing import Any, Dict, List
+from typing import Any, AsyncIterator, Dict, List
+import asyncio
+import logging
 import os
+import random
+import re
+import threading
+import time
+import weakref
 
-from .privacy import mask_text
+import pandas as pd
+
+from .metrics import LLM_FALLBACKS, LLM_IN_FLIGHT
+from .privacy import PrivacyMasker, get_masker
+
+logger = logging.getLogger(__name__)
 
 TEMPLATE_FALLBACK = (
     "Thanks for reaching out! Based on your profile and recent visits, the nearest "
@@ -10,32 +22,217 @@ TEMPLATE_FALLBACK = (
     "counter to redeem your offer."
 )
 
+STUB_REPLY = (
+    "Hi there! Your nearest open store is just around the corner and your coupon "
+    "is ready to use. See you soon!"
+)
 
-def build_prompt(context: Dict[str, Any], user_message: str, rag_snippets: List[str]) -> str:
+SYSTEM_MESSAGE = (
+    "You are PulseCX, a helpful, precise retail assistant. "
+    "Always ground your answers in the given context."
+)
+
+
+class StreamInterrupted(RuntimeError):
     """
-    Build the prompt that will be sent to the LLM (or used for template response).
+    Raised by a reply stream that timed out or failed after tokens were
+    already sent, so the reply the caller has is truncated.
     """
-    safe_message = mask_text(user_message)
 
-    prompt = (
-        "You are PulseCX, a hyper-personalized retail assistant. "
-        "You MUST answer using only the provided structured context. "
-        "If you don't know something from the context, say you are not sure.\n\n"
-        f"Customer context: {context.get('customer')}\n"
-        f"Recent orders: {context.get('recent_orders')}\n"
-        f"Nearest store: {context.get('store')}\n"
-        f"Available coupons: {context.get('coupons')}\n"
+
+# Fields of each context record that are rendered into the prompt, in order.
+_CUSTOMER_FIELDS = ("name", "city", "loyalty_tier")
+_CUSTOMER_LOCATION_FIELDS = ("lat", "lon")
+_ORDER_FIELDS = ("created_at", "item", "quantity", "status")
+_STORE_FIELDS = ("name", "city", "distance_m", "open_hour", "close_hour")
+_COUPON_FIELDS = ("discount_percent", "store_id", "valid_to", "expiry_date")
+
+PROMPT_PREAMBLE = (
+    "You are PulseCX, a hyper-personalized retail assistant. "
+    "You MUST answer using only the provided structured context. "
+    "If you don't know something from the context, say you are not sure.\n\n"
+)
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Cheap token estimate (~4 characters per token for English text).
+    """
+    return (len(text) + 3) // 4
+
+
+def _format_value(key: str, value: Any) -> str:
+    if hasattr(value, "strftime"):
+        # Dates only: the time of day adds tokens without helping the answer.
+        return value.strftime("%Y-%m-%d")
+    if isinstance(value, float):
+        if key == "distance_m":
+            return str(int(round(value)))
+        return f"{value:.3f}".rstrip("0").rstrip(".")
+    return str(value)
+
+
+def _render_record(record: Dict[str, Any] | None, fields: tuple, masker: PrivacyMasker | None = None) -> str:
+    if not record:
+        return "none"
+    if masker is not None:
+        record = masker.mask_record(record)
+    parts = []
+    for key in fields:
+        value = record.get(key)
+        # None, NaN, NaT and pd.NA (e.g. a coupon without expiry_date) are left out.
+        if pd.api.types.is_scalar(value) and pd.isna(value):
+            continue
+        parts.append(f"{key}={_format_value(key, value)}")
+    return ", ".join(parts) if parts else "none"
+
+
+def _render_records(
+    records: List[Dict[str, Any]], fields: tuple, limit: int, masker: PrivacyMasker | None = None
+) -> str:
+    if not records:
+        return "none"
+    rendered = " | ".join(_render_record(r, fields, masker) for r in records[:limit])
+    if len(records) > limit:
+        rendered += f" (+{len(records) - limit} more)"
+    return rendered
+
+
+def render_customer_context(
+    customer: Dict[str, Any] | None,
+    recent_orders: List[Dict[str, Any]],
+    coupons: List[Dict[str, Any]],
+    prompt_cfg: Dict[str, Any] | None = None,
+    privacy_cfg: Dict[str, Any] | None = None,
+) -> str:
+    """
+    Render the per-customer part of the context: profile, orders, coupons.
+
+    Only whitelisted fields are kept, numbers are rounded and lists are
+    capped (prompt.max_orders / prompt.max_coupons). Values go through the
+    privacy masker, and the customer's coordinates are dropped unless
+    privacy.mask_exact_address is false.
+    """
+    prompt_cfg = prompt_cfg or {}
+    privacy_cfg = privacy_cfg or {}
+    masker = get_masker(privacy_cfg)
+
+    customer_fields = _CUSTOMER_FIELDS
+    if not privacy_cfg.get("mask_exact_address", True):
+        customer_fields += _CUSTOMER_LOCATION_FIELDS
+
+    orders = _render_records(recent_orders, _ORDER_FIELDS, prompt_cfg.get("max_orders", 3), masker)
+    coupons_text = _render_records(coupons, _COUPON_FIELDS, prompt_cfg.get("max_coupons", 3), masker)
+    return (
+        f"Customer: {_render_record(customer, customer_fields, masker)}\n"
+        f"Recent orders: {orders}\n"
+        f"Available coupons: {coupons_text}\n"
     )
 
-    if rag_snippets:
-        prompt += f"\nRelevant policy snippets: {rag_snippets}\n"
 
-    prompt += f"\nUser message: {safe_message}\n"
-    prompt += "Respond in under 80 words, friendly and specific.\n"
+def render_context(
+    context: Dict[str, Any],
+    prompt_cfg: Dict[str, Any] | None = None,
+    privacy_cfg: Dict[str, Any] | None = None,
+    customer_fragment: str | None = None,
+) -> str:
+    """
+    Compact, deterministic rendering of the structured context.
+
+    ``customer_fragment`` is a cached render_customer_context() result for
+    the same customer; when given it is used as-is.
+    """
+    if customer_fragment is None:
+        customer_fragment = render_customer_context(
+            context.get("customer"),
+            context.get("recent_orders") or [],
+            context.get("coupons") or [],
+            prompt_cfg,
+            privacy_cfg,
+        )
+    store = _render_record(context.get("store"), _STORE_FIELDS, get_masker(privacy_cfg))
+    return customer_fragment + f"Nearest store: {store}\n"
+
+
+def render_cache_context(
+    customer_fragment: str,
+    store: Dict[str, Any] | None,
+    distance_bucket_m: float = 250,
+) -> str:
+    """
+    The part of the context a cached reply has to match.
+
+    The rendered customer context is used as-is (what the prompt shows of
+    the profile, orders and coupons); the store is reduced to its id and
+    a distance bucket, so requests from nearby locations share replies.
+    """
+    if not store:
+        return customer_fragment + "Nearest store: none\n"
+    distance = store.get("distance_m")
+    bucket = "?" if distance is None or pd.isna(distance) else int(distance // distance_bucket_m)
+    return customer_fragment + f"Nearest store: {store.get('store_id')}, distance bucket {bucket}\n"
+
+
+def build_prompt(
+    context: Dict[str, Any],
+    user_message: str,
+    rag_snippets: List[str],
+    prompt_cfg: Dict[str, Any] | None = None,
+    privacy_cfg: Dict[str, Any] | None = None,
+    customer_fragment: str | None = None,
+) -> str:
+    """
+    Build the prompt that will be sent to the LLM (or used for template response).
+
+    If the prompt exceeds prompt.token_budget, trailing RAG snippets are
+    dropped until it fits (or none are left).
+    """
+    prompt_cfg = prompt_cfg or {}
+    safe_message = get_masker(privacy_cfg).mask_text(user_message)
+
+    head = PROMPT_PREAMBLE + render_context(context, prompt_cfg, privacy_cfg, customer_fragment)
+    tail = f"\nUser message: {safe_message}\n" + "Respond in under 80 words, friendly and specific.\n"
+
+    budget = prompt_cfg.get("token_budget")
+    snippets = list(rag_snippets)
+    while True:
+        prompt = head
+        if snippets:
+            prompt += "\nRelevant policy snippets:\n" + "".join(f"- {s}\n" for s in snippets)
+        prompt += tail
+        if budget is None or estimate_tokens(prompt) <= budget or not snippets:
+            break
+        snippets.pop()
+
+    if budget is not None and estimate_tokens(prompt) > budget:
+        logger.debug("Prompt is ~%d tokens, over the %d token budget", estimate_tokens(prompt), budget)
 
     return prompt
 
 
+def _messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": SYSTEM_MESSAGE},
+        {"role": "user", "content": prompt},
+    ]
+
+
+_groq_clients: Dict[str, Any] = {}
+_groq_clients_lock = threading.Lock()
+
+
+def _get_groq_client(groq_cls: Any, api_key: str, llm_cfg: Dict[str, Any]) -> Any:
+    """
+    Return a process-wide Groq client so its HTTP connection pool is reused.
+    """
+    with _groq_clients_lock:
+        client = _groq_clients.get(api_key)
+        if client is None:
+            client = groq_cls(api_key=api_key, timeout=llm_cfg.get("timeout_s", 10.0))
+            _groq_clients[api_key] = client
+        return client
+
+
 def _call_groq(prompt: str, llm_cfg: Dict[str, Any]) -> str:
     """
     Call Groq chat completions API. Requires:
@@ -46,48 +243,252 @@ def _call_groq(prompt: str, llm_cfg: Dict[str, Any]) -> str:
         from groq import Groq  # type: ignore
     except Exception:
         # Library not installed – fall back
+        LLM_FALLBACKS.inc(reason="missing_library")
         return TEMPLATE_FALLBACK
 
     api_key = os.environ.get("GROQ_API_KEY")
     if not api_key:
         # No key in env – fall back
+        LLM_FALLBACKS.inc(reason="missing_api_key")
         return TEMPLATE_FALLBACK
 
-    client = Groq(api_key=api_key)
+    client = _get_groq_client(Groq, api_key, llm_cfg)
 
     model = llm_cfg.get("model", "llama-3.3-70b-versatile")
 
+    LLM_IN_FLIGHT.inc()
     try:
         completion = client.chat.completions.create(
             model=model,
-            messages=[
-                {
-                    "role": "system",
-                    "content": (
-                        "You are PulseCX, a helpful, precise retail assistant. "
-                        "Always ground your answers in the given context."
-                    ),
-                },
-                {"role": "user", "content": prompt},
-            ],
+            messages=_messages(prompt),
             max_tokens=llm_cfg.get("max_tokens", 400),
         )
         return completion.choices[0].message.content  # type: ignore[index]
-    except Exception:
-        # Any Groq API error – silently fall back for demo stability
+    except Exception as exc:
+        # Any Groq API error – fall back for demo stability (counted and logged)
+        LLM_FALLBACKS.inc(reason="error")
+        logger.warning("LLM call failed: %s", exc)
         return TEMPLATE_FALLBACK
+    finally:
+        LLM_IN_FLIGHT.dec()
+
+
+def _call_stub(prompt: str, llm_cfg: Dict[str, Any]) -> str:
+    """
+    Offline provider for load testing: blocks for ``stub_latency_ms`` (plus
+    up to ``stub_jitter_ms``) and returns STUB_REPLY, or TEMPLATE_FALLBACK
+    after ``timeout_s`` if that is shorter, like AsyncLLMClient.
+    """
+    latency_s = llm_cfg.get("stub_latency_ms", 300) / 1000
+    latency_s += random.uniform(0, llm_cfg.get("stub_jitter_ms", 0)) / 1000
+    timeout_s = float(llm_cfg.get("timeout_s", 10.0))
+
+    LLM_IN_FLIGHT.inc()
+    try:
+        if latency_s > timeout_s:
+            time.sleep(timeout_s)
+            LLM_FALLBACKS.inc(reason="timeout")
+            logger.warning("LLM call timed out after %.1fs", timeout_s)
+            return TEMPLATE_FALLBACK
+        time.sleep(latency_s)
+        return STUB_REPLY
+    finally:
+        LLM_IN_FLIGHT.dec()
 
 
 def call_llm(prompt: str, llm_cfg: Dict[str, Any]) -> str:
     """
     Dispatch to the correct LLM provider. Currently supports:
       - provider: "groq"
+      - provider: "stub" (offline, fixed latency; see AsyncLLMClient)
       - provider: "template" (fallback)
     """
     provider = llm_cfg.get("provider", "template").lower()
 
     if provider == "groq":
         return _call_groq(prompt, llm_cfg)
+    if provider == "stub":
+        return _call_stub(prompt, llm_cfg)
 
     # Default: deterministic template answer so the project runs offline
+    LLM_FALLBACKS.inc(reason="provider")
     return TEMPLATE_FALLBACK
+
+
+class AsyncLLMClient:
+    """
+    Long-lived async LLM client shared by all requests on one event loop.
+
+    Reuses the provider's HTTP connection pool, applies a per-call deadline
+    (``llm.timeout_s``) and caps in-flight calls with a semaphore
+    (``llm.max_concurrency``). Any error or timeout returns
+    TEMPLATE_FALLBACK, like the sync path.
+
+    ``stream`` yields the reply token by token as the provider produces it;
+    the deadline then covers the whole stream.
+
+    Providers:
+      - "groq": groq.AsyncGroq, created once
+      - "stub": offline provider that sleeps ``stub_latency_ms`` (plus up to
+        ``stub_jitter_ms``) and returns STUB_REPLY, for load testing
+      - anything else: TEMPLATE_FALLBACK
+    """
+
+    def __init__(self, llm_cfg: Dict[str, Any]) -> None:
+        self.llm_cfg = llm_cfg
+        self.provider = llm_cfg.get("provider", "template").lower()
+        self.timeout_s = float(llm_cfg.get("timeout_s", 10.0))
+        self.max_concurrency = int(llm_cfg.get("max_concurrency", 32))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._groq: Any = None
+        self.in_flight = 0
+
+    def _get_groq(self) -> Any:
+        if self._groq is None:
+            from groq import AsyncGroq  # type: ignore
+
+            api_key = os.environ.get("GROQ_API_KEY")
+            if not api_key:
+                raise RuntimeError("GROQ_API_KEY is not set")
+            # Deadlines are enforced by complete(); no SDK-level retries so
+            # a slow call cannot outlive its deadline.
+            self._groq = AsyncGroq(api_key=api_key, timeout=self.timeout_s, max_retries=0)
+        return self._groq
+
+    async def _complete_groq(self, prompt: str) -> str:
+        completion = await self._get_groq().chat.completions.create(
+            model=self.llm_cfg.get("model", "llama-3.3-70b-versatile"),
+            messages=_messages(prompt),
+            max_tokens=self.llm_cfg.get("max_tokens", 400),
+        )
+        return completion.choices[0].message.content  # type: ignore[index]
+
+    async def _complete_stub(self, prompt: str) -> str:
+        latency_ms = self.llm_cfg.get("stub_latency_ms", 300)
+        latency_ms += random.uniform(0, self.llm_cfg.get("stub_jitter_ms", 0))
+        await asyncio.sleep(latency_ms / 1000)
+        return STUB_REPLY
+
+    async def complete(self, prompt: str) -> str:
+        if self.provider not in ("groq", "stub"):
+            LLM_FALLBACKS.inc(reason="provider")
+            return TEMPLATE_FALLBACK
+
+        async with self._semaphore:
+            self.in_flight += 1
+            LLM_IN_FLIGHT.inc()
+            try:
+                if self.provider == "groq":
+                    call = self._complete_groq(prompt)
+                else:
+                    call = self._complete_stub(prompt)
+                return await asyncio.wait_for(call, timeout=self.timeout_s)
+            except asyncio.TimeoutError:
+                LLM_FALLBACKS.inc(reason="timeout")
+                logger.warning("LLM call timed out after %.1fs", self.timeout_s)
+                return TEMPLATE_FALLBACK
+            except Exception as exc:
+                LLM_FALLBACKS.inc(reason="error")
+                logger.warning("LLM call failed: %s", exc)
+                return TEMPLATE_FALLBACK
+            finally:
+                self.in_flight -= 1
+                LLM_IN_FLIGHT.dec()
+
+    async def _stream_groq(self, prompt: str) -> AsyncIterator[str]:
+        stream = await self._get_groq().chat.completions.create(
+            model=self.llm_cfg.get("model", "llama-3.3-70b-versatile"),
+            messages=_messages(prompt),
+            max_tokens=self.llm_cfg.get("max_tokens", 400),
+            stream=True,
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    async def _stream_stub(self, prompt: str) -> AsyncIterator[str]:
+        # Same total latency as _complete_stub, with the first token after a quarter of it.
+        latency_s = self.llm_cfg.get("stub_latency_ms", 300) / 1000
+        latency_s += random.uniform(0, self.llm_cfg.get("stub_jitter_ms", 0)) / 1000
+        tokens = re.findall(r"\S+\s*", STUB_REPLY)
+        await asyncio.sleep(latency_s / 4)
+        for token in tokens:
+            yield token
+            await asyncio.sleep(latency_s * 3 / 4 / len(tokens))
+
+    async def stream(self, prompt: str) -> AsyncIterator[str]:
+        if self.provider not in ("groq", "stub"):
+            LLM_FALLBACKS.inc(reason="provider")
+            yield TEMPLATE_FALLBACK
+            return
+
+        async with self._semaphore:
+            self.in_flight += 1
+            LLM_IN_FLIGHT.inc()
+            loop = asyncio.get_running_loop()
+            deadline = loop.time() + self.timeout_s
+            tokens = self._stream_groq(prompt) if self.provider == "groq" else self._stream_stub(prompt)
+            sent_any = False
+            try:
+                while True:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        raise asyncio.TimeoutError
+                    try:
+                        token = await asyncio.wait_for(tokens.__anext__(), timeout=remaining)
+                    except StopAsyncIteration:
+                        break
+                    sent_any = True
+                    yield token
+            except asyncio.TimeoutError as exc:
+                logger.warning("LLM stream timed out after %.1fs", self.timeout_s)
+                if sent_any:
+                    raise StreamInterrupted(f"timed out after {self.timeout_s:.1f}s") from exc
+                LLM_FALLBACKS.inc(reason="timeout")
+                yield TEMPLATE_FALLBACK
+            except Exception as exc:
+                logger.warning("LLM stream failed: %s", exc)
+                if sent_any:
+                    raise StreamInterrupted(str(exc)) from exc
+                LLM_FALLBACKS.inc(reason="error")
+                yield TEMPLATE_FALLBACK
+            finally:
+                self.in_flight -= 1
+                LLM_IN_FLIGHT.dec()
+                await tokens.aclose()
+
+
+# One client per event loop: the semaphore and the HTTP pool are loop-bound.
+# Clients are keyed by id(llm_cfg); each client holds a reference to its
+# config, so the id cannot be reused while the entry exists.
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[int, AsyncLLMClient]]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_llm_client(llm_cfg: Dict[str, Any]) -> AsyncLLMClient:
+    """
+    Return the shared AsyncLLMClient for this config on the running loop.
+    """
+    per_loop = _async_clients.setdefault(asyncio.get_running_loop(), {})
+    client = per_loop.get(id(llm_cfg))
+    if client is None:
+        client = per_loop[id(llm_cfg)] = AsyncLLMClient(llm_cfg)
+    return client
+
+
+async def call_llm_async(prompt: str, llm_cfg: Dict[str, Any]) -> str:
+    """
+    Async counterpart of call_llm using the pooled AsyncLLMClient.
+    """
+    return await get_llm_client(llm_cfg).complete(prompt)
+
+
+async def stream_llm(prompt: str, llm_cfg: Dict[str, Any]) -> AsyncIterator[str]:
+    """
+    Yield reply tokens as they arrive from the pooled AsyncLLMClient.
+
+    Raises StreamInterrupted if the stream breaks off after the first token.
+    """
+    async for token in get_llm_client(llm_cfg).stream(prompt):
+        yield token
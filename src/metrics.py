@@ -0,0 +1,263 @@
+from __future__ import annotations
+
+import bisect
+import inspect
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; covers sub-millisecond lookups up to multi-second LLM calls.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (labels, value) pairs produced by a collector for one metric family.
+Samples = List[Tuple[Dict[str, str], float]]
+# (name, type, help, samples) families produced by a collector at scrape time.
+Family = Tuple[str, str, str, Samples]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(str(v))}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Registry:
+    """
+    Holds metrics and scrape-time collectors, renders the Prometheus text format.
+    """
+
+    def __init__(self) -> None:
+        self._metrics: List[_Metric] = []
+        # Zero-argument callables returning the collector, or None once it is gone.
+        self._collectors: List[Callable[[], Callable[[], Iterable[Family]] | None]] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: "_Metric") -> None:
+        with self._lock:
+            self._metrics.append(metric)
+
+    def add_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        """
+        Register a callable returning (name, type, help, samples) families on each scrape.
+
+        Bound methods are held weakly: the collector is dropped once its
+        object is garbage collected, instead of keeping it alive and
+        reporting stale values.
+        """
+        ref = weakref.WeakMethod(collector) if inspect.ismethod(collector) else (lambda: collector)
+        with self._lock:
+            self._collectors.append(ref)
+
+    def remove_collector(self, collector: Callable[[], Iterable[Family]]) -> None:
+        with self._lock:
+            self._collectors = [ref for ref in self._collectors if ref() not in (None, collector)]
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics)
+            resolved = [(ref, ref()) for ref in self._collectors]
+            self._collectors = [ref for ref, collector in resolved if collector is not None]
+            collectors = [collector for _, collector in resolved if collector is not None]
+
+        lines: List[str] = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collector in collectors:
+            for name, kind, help_text, samples in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.extend(f"{name}{_format_labels(labels)} {_format_value(v)}" for labels, v in samples)
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        registry: Registry | None = REGISTRY,
+    ) -> None:
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        if not self.label_names and self.kind in ("counter", "gauge"):
+            self._children[()] = 0.0  # export 0 before the first update
+        self._lock = threading.Lock()
+        if registry is not None:
+            registry.register(self)
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        if set(labels) != set(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    def _header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._children.items())
+        return self._header() + [
+            f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Counter(_Metric):
+    """
+    Monotonically increasing count, optionally split by labels.
+    """
+
+    kind = "counter"
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._children.get(self._key(labels), 0.0)
+
+
+class Gauge(_Metric):
+    """
+    Value that can go up and down (e.g. in-flight calls).
+    """
+
+    kind = "gauge"
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._children[self._key(labels)] = value
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._children[key] = self._children.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+    def value(self, **labels: Any) -> float:
+        return self._children.get(self._key(labels), 0.0)
+
+
+class Histogram(_Metric):
+    """
+    Bucketed distribution of observations (cumulative buckets, sum, count).
+    """
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help_text: str,
+        label_names: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+        registry: Registry | None = REGISTRY,
+    ) -> None:
+        super().__init__(name, help_text, label_names, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            child = self._children.get(key)
+            if child is None:
+                # Per-bucket counts (last slot is +Inf), sum, count.
+                child = self._children[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            child[0][index] += 1
+            child[1] += value
+            child[2] += 1
+
+    def count(self, **labels: Any) -> int:
+        child = self._children.get(self._key(labels))
+        return child[2] if child else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, (list(c[0]), c[1], c[2])) for key, c in self._children.items())
+
+        lines = self._header()
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                bucket_labels = _format_labels({**labels, "le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{bucket_labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+# --------------------------------------------------------------
+# PulseCX metrics
+# --------------------------------------------------------------
+STAGE_SECONDS = Histogram(
+    "pulsecx_stage_duration_seconds",
+    "Time spent per request stage (data, geo, rag, rag_encode, rag_search, prompt, llm, fallback, ...).",
+    ["stage"],
+)
+REQUEST_SECONDS = Histogram(
+    "pulsecx_request_duration_seconds",
+    "End-to-end HTTP request latency by route.",
+    ["route"],
+)
+PROMPT_TOKENS = Histogram(
+    "pulsecx_prompt_tokens",
+    "Estimated prompt size in tokens.",
+    buckets=(100, 200, 300, 400, 500, 600, 800, 1000, 1500, 2000, 4000),
+)
+LLM_FALLBACKS = Counter(
+    "pulsecx_llm_fallbacks_total",
+    "LLM calls answered with the template fallback, by reason.",
+    ["reason"],
+)
+LLM_IN_FLIGHT = Gauge(
+    "pulsecx_llm_in_flight",
+    "LLM calls currently in flight.",
+)
+DEGRADED = Counter(
+    "pulsecx_degraded_total",
+    "Requests answered without a stage (timed out, failed or still warming up).",
+    ["stage"],
+)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_SECONDS.observe(seconds, stage=stage)
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """
+    Format stage timings (ms) as a Server-Timing header value.
+    """
+    return ", ".join(f"{stage};dur={ms}" for stage, ms in timings.items())
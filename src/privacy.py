@@ -1,17 +1,43 @@
 import re
+import sys
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Tuple
 
 
-_PHONE_REGEX = re.compile(r"\b\d{3}[-.\s]?\d{3}[-.\s]?\d{4}\b")
-_EMAIL_REGEX = re.compile(r"[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+")
+_LOCAL_CHARS = "a-zA-Z0-9_.+-"
+# Possessive quantifiers (3.11+) stop a failed email match from backtracking
+# through the whole run of local-part characters.
+_POSSESSIVE = "+" if sys.version_info >= (3, 11) else ""
 
+# Every branch starts with a plain character class, so the regex engine can
+# skip ahead to candidate characters; the lookbehind right after it then
+# rejects matches that start mid-word. That keeps a single pass linear even
+# on long runs of letters/digits that contain no "@".
+_EMAIL_PATTERN = (
+    rf"(?P<email>[{_LOCAL_CHARS}](?<![{_LOCAL_CHARS}][{_LOCAL_CHARS}])"
+    rf"[{_LOCAL_CHARS}]*{_POSSESSIVE}@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+)"
+)
+_PHONE_PATTERN = r"(?P<phone>\d(?<!\w\d)\d{2}[-.\s]?\d{3}[-.\s]?\d{4}\b)"
+_PHONE_REGEX = re.compile(_PHONE_PATTERN)
+# "12.971623, 77.594612"-style coordinate pairs (3+ decimals ~ street level).
+_COORDS_PATTERN = r"(?P<coords>[-\d](?<![\d.][-\d])\d{0,2}\.\d{3,}\s*,\s*-?\d{1,3}\.\d{3,}(?![\d.]))"
 
-def _mask_phone_match(match: re.Match) -> str:
-    number = match.group()
+# Every email contains "@" and every phone/coordinate match a digit; texts
+# lacking them skip those branches (cheap C-level scans before the regex).
+_DIGIT = re.compile(r"\d")
+
+# Structured-context keys that pin down where a customer lives.
+_ADDRESS_FIELDS = frozenset({"lat", "lon", "latitude", "longitude", "address", "street", "zip", "postcode"})
+
+# Separator for mask_many's single pass; it cannot be part of any match.
+_BATCH_SEPARATOR = "\x00"
+
+
+def _mask_phone(number: str) -> str:
     return "***-***-" + number[-4:]
 
 
-def _mask_email_match(match: re.Match) -> str:
-    email = match.group()
+def _mask_email(email: str) -> str:
     local, _, domain = email.partition("@")
     if len(local) <= 2:
         masked_local = "*" * len(local)
@@ -20,11 +46,154 @@ def _mask_email_match(match: re.Match) -> str:
     return f"{masked_local}@{domain}"
 
 
-def mask_text(text: str) -> str:
+def _coarsen_coords(pair: str) -> str:
+    lat, _, lon = pair.partition(",")
+    return f"{float(lat):.2f}, {float(lon):.2f}"
+
+
+def _replace(match: re.Match) -> str:
+    kind = match.lastgroup
+    text = match.group()
+    if kind == "email":
+        return _mask_email(text)
+    if kind == "phone":
+        return _mask_phone(text)
+    return _coarsen_coords(text)
+
+
+def _replace_with_phones(match: re.Match) -> str:
+    # An email match can swallow a phone number in its domain ("x@5551234567.io");
+    # mask it there too, as the old phone-then-email passes did.
+    if match.lastgroup == "email":
+        email = match.group()
+        local, _, domain = email.partition("@")
+        if _PHONE_REGEX.search(domain):
+            email = f"{local}@{_PHONE_REGEX.sub(lambda m: _mask_phone(m.group()), domain)}"
+        return _mask_email(email)
+    return _replace(match)
+
+
+class PrivacyMasker:
+    """
+    Single-pass PII masking driven by the ``privacy:`` config section.
+
+    All enabled patterns (phone, email, street-level coordinates) are
+    combined into one compiled alternation, so each text is scanned once.
+    The alternation is precompiled per combination of "text contains @" and
+    "text contains a digit", so ordinary prose only runs the branches that
+    could match (or no regex at all).
+    Flags: mask_phone, mask_email, mask_exact_address (all default true).
+    """
+
+    def __init__(self, privacy_cfg: Dict[str, Any] | None = None) -> None:
+        privacy_cfg = privacy_cfg or {}
+        self.mask_phone = privacy_cfg.get("mask_phone", True)
+        self.mask_email = privacy_cfg.get("mask_email", True)
+        self.mask_exact_address = privacy_cfg.get("mask_exact_address", True)
+
+        self._regexes: Dict[Tuple[bool, bool], re.Pattern | None] = {}
+        for has_at in (False, True):
+            for has_digit in (False, True):
+                # Email comes first: where a full address matches ("9876543210@gmail.com")
+                # it wins, while digits followed by "@" but no address ("555-123-4567@home")
+                # still fall through to the phone branch.
+                patterns = []
+                if self.mask_email and has_at:
+                    patterns.append(_EMAIL_PATTERN)
+                if self.mask_phone and has_digit:
+                    patterns.append(_PHONE_PATTERN)
+                if self.mask_exact_address and has_digit:
+                    patterns.append(_COORDS_PATTERN)
+                # The leading lookahead gives the engine one character class to
+                # skip ahead with, which the bare alternation does not.
+                lead = _LOCAL_CHARS if self.mask_email and has_at else r"\d-"
+                self._regexes[has_at, has_digit] = (
+                    re.compile(rf"(?=[{lead}])(?:{'|'.join(patterns)})") if patterns else None
+                )
+        self._replace = _replace_with_phones if self.mask_phone and self.mask_email else _replace
+
+    def _regex_for(self, text: str) -> re.Pattern | None:
+        return self._regexes["@" in text, _DIGIT.search(text) is not None]
+
+    def mask_text(self, text: str) -> str:
+        regex = self._regex_for(text)
+        if regex is None:
+            return text
+        return regex.sub(self._replace, text)
+
+    def mask_many(self, texts: Iterable[str]) -> List[str]:
+        """
+        Mask many texts with one regex pass over their concatenation.
+        """
+        texts = list(texts)
+        if not texts:
+            return texts
+        if any(_BATCH_SEPARATOR in t for t in texts):
+            return [self.mask_text(t) for t in texts]
+        joined = _BATCH_SEPARATOR.join(texts)
+        regex = self._regex_for(joined)
+        if regex is None:
+            return texts
+        return regex.sub(self._replace, joined).split(_BATCH_SEPARATOR)
+
+    def mask_record(self, record: Dict[str, Any] | None) -> Dict[str, Any] | None:
+        """
+        Mask a structured context record (customer, store, order, ...).
+
+        Phone/email fields are masked whatever their format, address and
+        coordinate fields are dropped when mask_exact_address is set, and
+        every other string value is scanned like free text.
+        """
+        if record is None:
+            return None
+
+        masked: Dict[str, Any] = {}
+        for key, value in record.items():
+            lowered = key.lower()
+            if self.mask_exact_address and lowered in _ADDRESS_FIELDS:
+                continue
+            if isinstance(value, str):
+                if self.mask_phone and "phone" in lowered:
+                    value = _mask_phone(value)
+                elif self.mask_email and "email" in lowered:
+                    value = _mask_email(value)
+                else:
+                    value = self.mask_text(value)
+            masked[key] = value
+        return masked
+
+
+@lru_cache(maxsize=None)
+def _masker_for(mask_phone: bool, mask_email: bool, mask_exact_address: bool) -> PrivacyMasker:
+    return PrivacyMasker({
+        "mask_phone": mask_phone,
+        "mask_email": mask_email,
+        "mask_exact_address": mask_exact_address,
+    })
+
+
+def get_masker(privacy_cfg: Dict[str, Any] | None = None) -> PrivacyMasker:
+    """
+    Shared PrivacyMasker for a ``privacy:`` config section.
+    """
+    privacy_cfg = privacy_cfg or {}
+    return _masker_for(
+        bool(privacy_cfg.get("mask_phone", True)),
+        bool(privacy_cfg.get("mask_email", True)),
+        bool(privacy_cfg.get("mask_exact_address", True)),
+    )
+
+
+def mask_text(text: str, privacy_cfg: Dict[str, Any] | None = None) -> str:
     """
     Mask phone numbers and emails inside a string.
     Used before sending anything to a public LLM.
     """
-    text = _PHONE_REGEX.sub(_mask_phone_match, text)
-    text = _EMAIL_REGEX.sub(_mask_email_match, text)
-    return text
+    return get_masker(privacy_cfg).mask_text(text)
+
+
+def mask_many(texts: Iterable[str], privacy_cfg: Dict[str, Any] | None = None) -> List[str]:
+    """
+    Batch version of mask_text.
+    """
+    return get_masker(privacy_cfg).mask_many(texts)
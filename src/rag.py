@@ -1,122 +1,833 @@
 from __future__ import annotations
 
+import hashlib
+import itertools
+import json
 import logging
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from pathlib import Path
-from typing import List
+from typing import Any, Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from .bm25 import BM25
+from .cache import TTLCache, normalize_text
+from .metrics import observe_stage
 
 logger = logging.getLogger(__name__)
 
-try:
-    from sentence_transformers import SentenceTransformer
-    import faiss
-except ImportError:  # RAG will gracefully degrade if libs missing
-    SentenceTransformer = None
-    faiss = None
+# sentence-transformers (torch) and faiss take seconds to import, so they are
+# imported on first build() rather than with this module; see _import_backends.
+SentenceTransformer = None
+faiss = None
 
 try:
     from pypdf import PdfReader
 except ImportError:
     PdfReader = None
 
+# Bump when chunking or the on-disk layout changes so old caches are ignored.
+_CACHE_VERSION = 2
+
+# Sentence ends (., ! or ? followed by whitespace) and blank-line paragraph breaks.
+_SENTENCE_BREAK = re.compile(r"(?<=[.!?])\s+|\n\s*\n")
+
+# Parsing moves to a process pool only when the estimated in-process parse
+# time outweighs the pool's startup (spawning workers that import numpy):
+# text chunks at ~10 MB/s, PDF extraction is roughly ten times slower.
+_PARSE_BYTES_PER_S = {".txt": 10e6, ".pdf": 1e6}
+_POOL_MIN_PARSE_S = 2.0
+_MAX_DEFAULT_INGEST_WORKERS = 4
+
+
+# dense: embeddings + FAISS. bm25: lexical only, no model or native libraries.
+# hybrid: BM25 picks candidates, embedding similarity orders them.
+RETRIEVERS = ("dense", "bm25", "hybrid")
+
+# Index types selectable from config. flat_l2 is the original exact L2
+# search; the others score by inner product, which is cosine similarity
+# once vectors are L2-normalized. ivf_flat, hnsw and ivf_pq are approximate.
+INDEX_TYPES = ("flat_l2", "flat_ip", "ivf_flat", "hnsw", "ivf_pq")
+
+DEFAULT_INDEX_PARAMS: Dict[str, Any] = {
+    "nlist": 256,
+    "nprobe": 16,
+    "hnsw_m": 32,
+    "ef_construction": 80,
+    "ef_search": 64,
+    "pq_m": 48,
+    "pq_nbits": 8,
+    "train_size": 65536,
+    "min_vectors": 1000,
+}
+
+# Query-time parameters: changing them does not require rebuilding the index.
+_SEARCH_PARAMS = ("nprobe", "ef_search")
+
+
+def _import_faiss() -> bool:
+    global faiss
+    if faiss is None:
+        try:
+            import faiss as faiss_module
+        except ImportError:
+            return False
+        faiss = faiss_module
+    return True
+
+
+def _import_backends() -> bool:
+    """
+    Import sentence-transformers and faiss on first use. False if either is missing.
+    """
+    global SentenceTransformer
+    if SentenceTransformer is None:
+        try:
+            from sentence_transformers import SentenceTransformer as st_cls
+        except ImportError:  # RAG will gracefully degrade if libs missing
+            return False
+        SentenceTransformer = st_cls
+    return _import_faiss()
+
+
+def build_faiss_index(matrix: np.ndarray, index_type: str = "flat_l2", params: Dict[str, Any] | None = None):
+    """
+    Build a FAISS index of ``index_type`` over the rows of ``matrix`` (float32).
+
+    Approximate types fall back to exact inner-product search below
+    ``min_vectors``, and IVF list counts and PQ code sizes are capped to
+    what the number of vectors can train.
+    """
+    params = {**DEFAULT_INDEX_PARAMS, **(params or {})}
+    n, dim = matrix.shape
+    if index_type not in ("flat_l2", "flat_ip") and n < int(params["min_vectors"]):
+        logger.info("Only %d vectors: using an exact flat_ip index instead of %s", n, index_type)
+        index_type = "flat_ip"
+
+    if index_type == "flat_l2":
+        index = faiss.IndexFlatL2(dim)
+    elif index_type == "flat_ip":
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, int(params["hnsw_m"]), faiss.METRIC_INNER_PRODUCT)
+        index.hnsw.efConstruction = int(params["ef_construction"])
+    elif index_type in ("ivf_flat", "ivf_pq"):
+        # k-means wants ~39 training points per list
+        n_train = min(n, int(params["train_size"]))
+        nlist = max(1, min(int(params["nlist"]), n_train // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        else:
+            pq_m = max(m for m in range(1, min(int(params["pq_m"]), dim) + 1) if dim % m == 0)
+            nbits = max(1, min(int(params["pq_nbits"]), int(np.log2(max(2, n_train // 39)))))
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, pq_m, nbits, faiss.METRIC_INNER_PRODUCT)
+        index.train(_training_sample(matrix, int(params["train_size"])))
+    else:
+        raise ValueError(f"Unknown RAG index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+
+    index.add(matrix)
+    set_search_params(index, params)
+    return index
+
+
+def set_search_params(index, params: Dict[str, Any]) -> None:
+    """
+    Apply query-time knobs: ``nprobe`` for IVF indexes, ``ef_search`` for HNSW.
+    """
+    if "nprobe" in params:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = int(params["nprobe"])
+    if "ef_search" in params and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = int(params["ef_search"])
+
+
+def evaluate_index(
+    index,
+    base: np.ndarray,
+    queries: np.ndarray,
+    top_k: int = 10,
+    sweep: Sequence[Dict[str, Any]] = ({},),
+) -> List[Dict[str, Any]]:
+    """
+    Recall@top_k and per-query latency of ``index`` against exact search over ``base``.
+
+    ``sweep`` lists search-parameter settings (e.g. ``{"nprobe": 4}``) to
+    measure in turn; the first row is the exact flat baseline. The index
+    is left with the last setting applied.
+    """
+    exact = faiss.IndexFlat(base.shape[1], index.metric_type)
+    exact.add(base)
+    truth, latencies = _search_one_by_one(exact, queries, top_k)
+    rows = [_evaluation_row("exact", {}, 1.0, latencies)]
+
+    for params in sweep:
+        set_search_params(index, params)
+        found, latencies = _search_one_by_one(index, queries, top_k)
+        hits = sum(len(set(f[f >= 0]) & set(t[t >= 0])) for f, t in zip(found, truth))
+        expected = sum(int((t >= 0).sum()) for t in truth)
+        rows.append(_evaluation_row("index", params, hits / expected if expected else 0.0, latencies))
+    return rows
+
+
+def _search_one_by_one(index, queries: np.ndarray, top_k: int) -> Tuple[np.ndarray, List[float]]:
+    """
+    Search queries individually, as /chat does, timing each call (ms).
+    """
+    ids = np.empty((len(queries), top_k), dtype="int64")
+    latencies: List[float] = []
+    for i in range(len(queries)):
+        started = time.perf_counter()
+        _, ids[i : i + 1] = index.search(queries[i : i + 1], top_k)
+        latencies.append((time.perf_counter() - started) * 1000)
+    return ids, latencies
+
+
+def _evaluation_row(name: str, params: Dict[str, Any], recall: float, latencies: List[float]) -> Dict[str, Any]:
+    p50, p95 = np.percentile(latencies, [50, 95]) if latencies else (0.0, 0.0)
+    total_s = sum(latencies) / 1000
+    return {
+        "index": name,
+        "params": dict(params),
+        "recall": round(recall, 4),
+        "p50_ms": round(float(p50), 4),
+        "p95_ms": round(float(p95), 4),
+        "qps": round(len(latencies) / total_s, 1) if total_s else 0.0,
+    }
+
+
+def _training_sample(matrix: np.ndarray, size: int) -> np.ndarray:
+    if len(matrix) <= size:
+        return matrix
+    rows = np.random.default_rng(0).choice(len(matrix), size=size, replace=False)
+    return matrix[np.sort(rows)]
+
+
+class _IndexBuilder:
+    """
+    Adds embedding batches to a FAISS index as they arrive.
+
+    Flat indexes are created from the first batch. Approximate types buffer
+    up to ``min_vectors`` (and ``train_size`` for IVF) vectors to train or
+    choose the exact fallback, then add the remaining batches directly.
+    """
+
+    def __init__(self, index_type: str, params: Dict[str, Any]):
+        self.index_type = index_type
+        self.params = params
+        self.index = None
+        self.buffer: List[np.ndarray] = []
+        self.buffered = 0
+        if index_type in ("flat_l2", "flat_ip"):
+            self.threshold = 0
+        elif index_type == "hnsw":
+            self.threshold = int(params["min_vectors"])
+        else:
+            self.threshold = max(int(params["min_vectors"]), int(params["train_size"]))
+
+    def add(self, vectors: np.ndarray) -> None:
+        if self.index is not None:
+            self.index.add(vectors)
+            return
+        self.buffer.append(vectors)
+        self.buffered += len(vectors)
+        if self.buffered >= self.threshold:
+            self._build()
+
+    def finish(self):
+        if self.index is None and self.buffer:
+            self._build()
+        return self.index
+
+    def _build(self) -> None:
+        matrix = np.concatenate(self.buffer)
+        self.buffer, self.buffered = [], 0
+        self.index = build_faiss_index(matrix, self.index_type, self.params)
+
+
+def chunk_text(text: str, max_tokens: int = 100, overlap_tokens: int = 20) -> List[str]:
+    """
+    Split text into chunks of whole sentences, at most ``max_tokens`` whitespace tokens each.
+
+    A chunk starts with the previous chunk's trailing sentences, up to
+    ``overlap_tokens``; sentences longer than ``max_tokens`` are cut into
+    ``max_tokens`` pieces.
+    """
+    chunks: List[str] = []
+    current: List[List[str]] = []
+    size = 0
+
+    for sentence in _SENTENCE_BREAK.split(text):
+        tokens = sentence.split()
+        for start in range(0, len(tokens), max_tokens):
+            piece = tokens[start : start + max_tokens]
+            if current and size + len(piece) > max_tokens:
+                chunks.append(" ".join(itertools.chain.from_iterable(current)))
+                while current and (size > overlap_tokens or size + len(piece) > max_tokens):
+                    size -= len(current.pop(0))
+            current.append(piece)
+            size += len(piece)
+
+    if current:
+        chunks.append(" ".join(itertools.chain.from_iterable(current)))
+    return chunks
+
+
+def _extract_text(path: Path) -> str:
+    if path.suffix.lower() == ".pdf":
+        reader = PdfReader(str(path))
+        return "\n".join(page.extract_text() or "" for page in reader.pages)
+    return path.read_text(encoding="utf-8", errors="ignore")
+
+
+def _estimated_parse_s(docs: List[Tuple[Path, str]]) -> float:
+    """
+    Rough in-process parse time of ``docs``, from file sizes.
+    """
+    total = 0.0
+    for path, _ in docs:
+        try:
+            total += path.stat().st_size / _PARSE_BYTES_PER_S.get(path.suffix.lower(), 10e6)
+        except OSError:
+            pass
+    return total
+
+
+def _parse_document(path: str, max_tokens: int, overlap_tokens: int) -> List[str]:
+    """
+    Extract and chunk one document; runs in the ingestion process pool.
+    """
+    return chunk_text(_extract_text(Path(path)), max_tokens, overlap_tokens)
+
 
 class RAGIndex:
     """
     Simple RAG index that loads .txt and .pdf documents from a folder,
     chunks them, builds embeddings, and performs similarity search.
+
+    If ``cache_dir`` is set, each document's chunks and embeddings are
+    stored on disk keyed by a hash of its bytes and the model name, and the
+    combined FAISS index is saved next to them. Restarts only re-embed new
+    or changed documents and memory-map the saved index.
+
+    Query embeddings and retrieval results are kept in bounded LRU/TTL
+    caches keyed on the normalized query text.
+
+    ``index_type`` picks the FAISS index (see INDEX_TYPES); ``index_params``
+    overrides DEFAULT_INDEX_PARAMS and may set ``normalize`` (default: on
+    for every type but flat_l2) to L2-normalize chunk and query vectors.
+
+    ``retriever`` is one of RETRIEVERS. bm25 needs neither the model nor
+    faiss, and is used instead of dense/hybrid when those are missing.
+    ``bm25_params`` sets k1, b and ``hybrid_candidates``.
+
+    Documents are ingested as a stream: a process pool extracts and chunks
+    them, chunks are embedded in batches of ``embed_batch_size`` and each
+    batch is added to the index, so peak memory follows the batch size
+    rather than the corpus.
     """
 
-    def __init__(self, docs_path: str):
+    def __init__(
+        self,
+        docs_path: str,
+        model_name: str = "all-MiniLM-L6-v2",
+        cache_dir: str | None = None,
+        query_cache_size: int = 1024,
+        query_cache_ttl_s: float | None = 600,
+        index_type: str = "flat_l2",
+        index_params: Dict[str, Any] | None = None,
+        chunk_tokens: int = 100,
+        chunk_overlap: int = 20,
+        embed_batch_size: int = 64,
+        ingest_workers: int | None = None,
+        retriever: str = "dense",
+        bm25_params: Dict[str, Any] | None = None,
+    ):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown RAG index type {index_type!r}, expected one of {', '.join(INDEX_TYPES)}")
+        if retriever not in RETRIEVERS:
+            raise ValueError(f"Unknown RAG retriever {retriever!r}, expected one of {', '.join(RETRIEVERS)}")
         self.docs_path = Path(docs_path)
+        self.model_name = model_name
+        self.cache_dir = Path(cache_dir) / _slug(model_name) if cache_dir else None
         self.model: SentenceTransformer | None = None
-        self.index: faiss.IndexFlatL2 | None = None  # type: ignore[type-arg]
+        self.index: faiss.Index | None = None  # type: ignore[type-arg]
+        self.index_type = index_type
+        self.index_params = {**DEFAULT_INDEX_PARAMS, **(index_params or {})}
+        self.normalize = bool(self.index_params.pop("normalize", index_type != "flat_l2"))
+        self.chunk_tokens = chunk_tokens
+        self.chunk_overlap = chunk_overlap
+        self.embed_batch_size = embed_batch_size
+        self.ingest_workers = ingest_workers or min(os.cpu_count() or 1, _MAX_DEFAULT_INGEST_WORKERS)
+        self.retriever = retriever
+        self.bm25_params = dict(bm25_params or {})
+        self.hybrid_candidates = int(self.bm25_params.pop("hybrid_candidates", 50))
+        self.lexical: BM25 | None = None
         self.chunks: List[str] = []
+        self.embedding_cache = TTLCache(query_cache_size, query_cache_ttl_s)
+        self.result_cache = TTLCache(query_cache_size, query_cache_ttl_s)
 
-    def _load_documents(self) -> List[str]:
-        texts: List[str] = []
-
+    def _document_paths(self) -> List[Path]:
         if not self.docs_path.exists():
             logger.warning("RAG docs path %s does not exist", self.docs_path)
-            return texts
+            return []
 
-        for path in self.docs_path.glob("**/*"):
-            if path.suffix.lower() == ".txt":
-                try:
-                    texts.append(path.read_text(encoding="utf-8", errors="ignore"))
-                except Exception as exc:
-                    logger.warning("Failed to read %s: %s", path, exc)
-            elif path.suffix.lower() == ".pdf" and PdfReader is not None:
-                try:
-                    reader = PdfReader(str(path))
-                    pages = [page.extract_text() or "" for page in reader.pages]
-                    texts.append("\n".join(pages))
-                except Exception as exc:
-                    logger.warning("Failed to read PDF %s: %s", path, exc)
+        suffixes = {".txt", ".pdf"} if PdfReader is not None else {".txt"}
+        return sorted(p for p in self.docs_path.glob("**/*") if p.suffix.lower() in suffixes)
 
-        return texts
+    def _get_model(self) -> SentenceTransformer:
+        if self.model is None:
+            self.model = SentenceTransformer(self.model_name)
+        return self.model
 
-    @staticmethod
-    def _chunk_text(text: str, chunk_size: int = 600, overlap: int = 120) -> List[str]:
+    def warm_model(self) -> None:
         """
-        Very simple character-based chunking. Enough for small docs.
+        Load the embedding model and run one throwaway encode, so the first
+        query does not pay for it. No-op for the BM25 retriever.
         """
-        chunks: List[str] = []
-        start = 0
-        length = len(text)
+        if self.retriever != "bm25":
+            self._get_model().encode(["warmup"])
 
-        if length == 0:
-            return chunks
+    def _doc_key(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with path.open("rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        digest.update(f"{self.model_name}|v{_CACHE_VERSION}|{self.chunk_tokens}/{self.chunk_overlap}".encode())
+        return digest.hexdigest()
 
-        while start < length:
-            end = min(start + chunk_size, length)
-            chunk = text[start:end].strip()
-            if chunk:
-                chunks.append(chunk)
-            start += chunk_size - overlap
+    def _document_keys(self) -> List[Tuple[Path, str]]:
+        """
+        (path, content key) for every readable document, in path order.
+        """
+        docs: List[Tuple[Path, str]] = []
+        for path in self._document_paths():
+            try:
+                docs.append((path, self._doc_key(path)))
+            except OSError as exc:
+                logger.warning("Failed to read %s: %s", path, exc)
+        return docs
 
-        return chunks
+    def _has_cached_doc(self, key: str) -> bool:
+        return (
+            self.cache_dir is not None
+            and (self.cache_dir / f"{key}.json").exists()
+            and (self.cache_dir / f"{key}.npy").exists()
+        )
+
+    def _load_cached_doc(self, key: str) -> Tuple[List[str], np.ndarray] | None:
+        if self.cache_dir is None:
+            return None
+        chunks_path = self.cache_dir / f"{key}.json"
+        emb_path = self.cache_dir / f"{key}.npy"
+        if not (chunks_path.exists() and emb_path.exists()):
+            return None
+        try:
+            chunks = json.loads(chunks_path.read_text(encoding="utf-8"))
+            return chunks, np.load(emb_path, mmap_mode="r")
+        except Exception as exc:
+            logger.warning("Ignoring unreadable RAG cache entry %s: %s", key, exc)
+            return None
+
+    def _save_cached_doc(self, key: str, chunks: List[str], embeddings: np.ndarray) -> None:
+        if self.cache_dir is None:
+            return
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        _atomic_write(self.cache_dir / f"{key}.npy", lambda f: np.save(f, embeddings))
+        _atomic_write(
+            self.cache_dir / f"{key}.json",
+            lambda f: f.write(json.dumps(chunks).encode("utf-8")),
+        )
+
+    def _parsed_documents(self, docs: List[Tuple[Path, str]]) -> Iterator[List[str] | Exception]:
+        """
+        Chunks of each document (or the error raised parsing it), in order.
+
+        When parsing is expected to take long enough to pay for starting
+        the workers (_POOL_MIN_PARSE_S), it runs in a process pool with at
+        most two documents per worker in flight, so parsed text never piles
+        up ahead of the embedding stage. If the pool cannot run, the
+        remaining documents are parsed in this process.
+        """
+        args = (self.chunk_tokens, self.chunk_overlap)
+        done = 0
+        if self.ingest_workers > 1 and len(docs) > 1 and _estimated_parse_s(docs) >= _POOL_MIN_PARSE_S:
+            # spawn: forking a process that already holds torch and threads is unsafe
+            context = multiprocessing.get_context("spawn")
+            workers = min(self.ingest_workers, len(docs))
+            try:
+                with ProcessPoolExecutor(workers, mp_context=context) as pool:
+                    todo = iter(docs[2 * workers :])
+                    window = deque(pool.submit(_parse_document, str(path), *args) for path, _ in docs[: 2 * workers])
+                    while window:
+                        future = window.popleft()
+                        for path, _ in itertools.islice(todo, 1):
+                            window.append(pool.submit(_parse_document, str(path), *args))
+                        try:
+                            chunks = future.result()
+                        except BrokenProcessPool:
+                            raise
+                        except Exception as exc:
+                            chunks = exc
+                        done += 1
+                        yield chunks
+            except BrokenProcessPool as exc:
+                logger.warning("RAG ingestion pool failed (%s); parsing remaining documents in-process", exc)
+
+        for path, _ in docs[done:]:
+            try:
+                yield _parse_document(str(path), *args)
+            except Exception as exc:
+                yield exc
+
+    def _documents(self, docs: List[Tuple[Path, str]]) -> Iterator[Tuple[str, List[str], np.ndarray | None]]:
+        """
+        Stage 1: (key, chunks, cached embeddings or None) per document, in path order.
+        """
+        has_cache = [self._has_cached_doc(key) for _, key in docs]
+        fresh = [doc for doc, cached in zip(docs, has_cache) if not cached]
+        parsed = self._parsed_documents(fresh)
+        reused = 0
+
+        for (path, key), in_cache in zip(docs, has_cache):
+            if not in_cache:
+                chunks = next(parsed)
+            else:
+                cached = self._load_cached_doc(key)
+                if cached is not None:
+                    reused += 1
+                    yield key, cached[0], cached[1]
+                    continue
+                chunks = next(self._parsed_documents([(path, key)]))  # unreadable cache entry
+            if isinstance(chunks, Exception):
+                logger.warning("Failed to read %s: %s", path, chunks)
+                continue
+            yield key, chunks, None
+
+        logger.info("RAG documents: %d parsed, %d reused from cache", len(fresh), reused)
+
+    def _embedded_batches(
+        self, documents: Iterator[Tuple[str, List[str], np.ndarray | None]]
+    ) -> Iterator[Tuple[List[str], np.ndarray]]:
+        """
+        Stages 2 and 3: (chunks, embeddings) in document order, at most embed_batch_size at a time.
+
+        Fresh chunks from consecutive documents share model batches; a
+        document's embeddings are cached once its last chunk is embedded.
+        Cached documents are passed through in slices of the same size.
+        """
+        size = self.embed_batch_size
+        batch: List[str] = []
+        owners: deque = deque()  # [key, chunks, embedded parts, chunks left] per document in the batch
+
+        def flush() -> Tuple[List[str], np.ndarray]:
+            embeddings = np.asarray(self._get_model().encode(batch), dtype="float32")
+            offset = 0
+            while offset < len(embeddings):
+                owner = owners[0]
+                take = min(owner[3], len(embeddings) - offset)
+                owner[2].append(embeddings[offset : offset + take])
+                owner[3] -= take
+                offset += take
+                if owner[3] == 0:
+                    self._save_cached_doc(owner[0], owner[1], np.concatenate(owner[2]))
+                    owners.popleft()
+            chunks = list(batch)
+            batch.clear()
+            return chunks, embeddings
+
+        for key, chunks, cached in documents:
+            if cached is not None:
+                if batch:
+                    yield flush()
+                for start in range(0, len(chunks), size):
+                    yield chunks[start : start + size], cached[start : start + size]
+                continue
+            if not chunks:
+                self._save_cached_doc(key, [], np.zeros((0, 0), dtype="float32"))
+                continue
+            owners.append([key, chunks, [], len(chunks)])
+            for chunk in chunks:
+                batch.append(chunk)
+                if len(batch) >= size:
+                    yield flush()
+
+        if batch:
+            yield flush()
 
     def build(self) -> None:
         """
         Build the FAISS index. Call once at startup.
         """
-        if SentenceTransformer is None or faiss is None:
+        if self.retriever != "bm25" and not _import_backends():
             logger.warning(
-                "sentence-transformers or faiss-cpu not installed. RAG will be disabled."
+                "sentence-transformers or faiss-cpu not installed. RAG falls back to BM25 retrieval."
             )
+            self.retriever = "bm25"
+
+        self.embedding_cache.clear()
+        self.result_cache.clear()
+        docs = self._document_keys()
+
+        if self.retriever == "bm25":
+            self._build_lexical(docs)
             return
 
-        raw_texts = self._load_documents()
-        for text in raw_texts:
-            self.chunks.extend(self._chunk_text(text))
+        index_path = None
+        if self.cache_dir is not None and docs:
+            keys = "|".join(key for _, key in docs)
+            index_key = hashlib.sha256(f"{keys}|{self._index_signature()}".encode()).hexdigest()[:16]
+            index_path = self.cache_dir / f"index-{index_key}.faiss"
+            if index_path.exists() and self._load_saved_index(docs, index_path):
+                self._attach_lexical()
+                return
 
-        if not self.chunks:
+        logger.info("Building %s RAG index from %d documents", self.index_type, len(docs))
+
+        builder = _IndexBuilder(self.index_type, self.index_params)
+        chunks: List[str] = []
+        for batch_chunks, embeddings in self._embedded_batches(self._documents(docs)):
+            chunks.extend(batch_chunks)
+            builder.add(self._prepare_vectors(np.array(embeddings, dtype="float32")))
+
+        if not chunks:
             logger.warning("No chunks built for RAG from %s", self.docs_path)
             return
 
-        logger.info("Building RAG index over %d chunks", len(self.chunks))
+        self.chunks = chunks
+        self.index = builder.finish()
+
+        if index_path is not None:
+            for stale in self.cache_dir.glob("index-*.faiss"):
+                stale.unlink(missing_ok=True)
+            tmp_path = index_path.with_suffix(f".{os.getpid()}.tmp")
+            faiss.write_index(self.index, str(tmp_path))
+            os.replace(tmp_path, index_path)
+
+        logger.info("RAG index built with dimension %d over %d chunks", self.index.d, len(self.chunks))
+        self._attach_lexical()
+
+    def _build_lexical(self, docs: List[Tuple[Path, str]]) -> None:
+        """
+        Chunk the documents and index them with BM25 only.
+        """
+        chunks = [chunk for _, doc_chunks, _ in self._documents(docs) for chunk in doc_chunks]
+        if not chunks:
+            logger.warning("No chunks built for RAG from %s", self.docs_path)
+            return
+        self.lexical = BM25(**self.bm25_params).fit(chunks)
+        self.chunks = chunks
+        logger.info("BM25 index built: %s", self.lexical.stats())
+
+    def _attach_lexical(self) -> None:
+        """
+        Hybrid mode: BM25 over the dense index's chunks, plus vector lookup by id for re-ranking.
+        """
+        if self.retriever != "hybrid":
+            return
+        self.lexical = BM25(**self.bm25_params).fit(self.chunks)
+        ivf = faiss.try_extract_index_ivf(self.index)
+        if ivf is not None:
+            ivf.make_direct_map()
+        logger.info("Hybrid retrieval: BM25 index built: %s", self.lexical.stats())
+
+    def _load_saved_index(self, docs: List[Tuple[Path, str]], index_path: Path) -> bool:
+        """
+        Use the saved index if the cached chunks of ``docs`` still line up with it.
+        """
+        chunks: List[str] = []
+        for _, key in docs:
+            cached = self._load_cached_doc(key)
+            if cached is not None:
+                chunks.extend(cached[0])
+
+        index = _read_index(index_path)
+        if index.ntotal != len(chunks):
+            logger.warning("Saved RAG index %s does not match the cached chunks; rebuilding", index_path)
+            return False
 
-        self.model = SentenceTransformer("all-MiniLM-L6-v2")
-        embeddings = self.model.encode(self.chunks)
-        dim = embeddings.shape[1]
+        set_search_params(index, self.index_params)
+        self.chunks, self.index = chunks, index
+        logger.info("RAG index loaded from %s (%d chunks)", index_path, len(self.chunks))
+        return True
 
-        self.index = faiss.IndexFlatL2(dim)
-        self.index.add(embeddings)
+    def _index_signature(self) -> str:
+        """
+        Index type and build-time parameters; part of the saved index's cache key.
+        """
+        build_params = {k: v for k, v in self.index_params.items() if k not in _SEARCH_PARAMS}
+        return json.dumps([self.index_type, self.normalize, build_params], sort_keys=True)
 
-        logger.info("RAG index built with dimension %d", dim)
+    def _prepare_vectors(self, matrix: np.ndarray) -> np.ndarray:
+        """
+        L2-normalize rows in place when the index scores by cosine similarity.
+        """
+        if self.normalize:
+            faiss.normalize_L2(matrix)
+        return matrix
 
-    def retrieve(self, query: str, top_k: int = 3) -> List[str]:
+    def retrieve(self, query: str, top_k: int = 3, timings: Dict[str, float] | None = None) -> List[str]:
         """
         Retrieve top_k similar chunks for the given query.
         """
-        if not self.chunks or self.index is None or self.model is None:
+        return self.retrieve_batch([query], top_k=top_k, timings=timings)[0]
+
+    def retrieve_batch(
+        self, queries: Sequence[str], top_k: int = 3, timings: Dict[str, float] | None = None
+    ) -> List[List[str]]:
+        """
+        Retrieve top_k chunks for many queries at once.
+
+        Cache misses are encoded in a single model forward pass and searched
+        with a single FAISS call (or scored with BM25, see ``retriever``).
+        Encode and search times are recorded as the rag_encode / rag_search
+        stages, and in ``timings`` (ms) if given.
+        """
+        if not self.chunks:
+            return [[] for _ in queries]
+
+        keys = [normalize_text(q) for q in queries]
+        results: List[List[str] | None] = [
+            self.result_cache.get((key, top_k)) for key in keys
+        ]
+
+        pending = list(dict.fromkeys(key for key, res in zip(keys, results) if res is None))
+        if pending:
+            indices = self._search(pending, top_k, timings)
+            found = {
+                key: [self.chunks[i] for i in row if 0 <= i < len(self.chunks)]
+                for key, row in zip(pending, indices)
+            }
+            for key, chunks in found.items():
+                self.result_cache.set((key, top_k), chunks)
+            results = [res if res is not None else found[key] for key, res in zip(keys, results)]
+
+        return [list(res) for res in results]
+
+    def _search(self, keys: List[str], top_k: int, timings: Dict[str, float] | None) -> List[np.ndarray]:
+        """
+        Chunk ids for each normalized query, best first, recording stage timings.
+        """
+        started = time.perf_counter()
+        if self.retriever == "bm25":
+            indices = [self.lexical.search(key, top_k)[0] for key in keys]
+            encoded = started
+        else:
+            q_emb = self._prepare_vectors(self._encode_queries(keys))
+            encoded = time.perf_counter()
+            if self.retriever == "hybrid":
+                indices = self._rerank(keys, q_emb, top_k)
+            else:
+                _, indices = self.index.search(q_emb, top_k)
+            observe_stage("rag_encode", encoded - started)
+        searched = time.perf_counter()
+        observe_stage("rag_search", searched - encoded)
+        if timings is not None:
+            if self.retriever != "bm25":
+                timings["rag_encode"] = round((encoded - started) * 1000, 3)
+            timings["rag_search"] = round((searched - encoded) * 1000, 3)
+        return indices
+
+    def _rerank(self, keys: List[str], q_emb: np.ndarray, top_k: int) -> List[np.ndarray]:
+        """
+        Order each query's BM25 candidates by embedding similarity.
+
+        Queries sharing no term with any chunk fall back to a full dense search.
+        """
+        indices: List[np.ndarray] = []
+        for key, query in zip(keys, q_emb):
+            candidates, _ = self.lexical.search(key, self.hybrid_candidates)
+            if not len(candidates):
+                indices.append(self.index.search(query[None, :], top_k)[1][0])
+                continue
+            vectors = self.index.reconstruct_batch(candidates)
+            if self.index.metric_type == faiss.METRIC_L2:
+                scores = -((vectors - query) ** 2).sum(axis=1)
+            else:
+                scores = vectors @ query
+            indices.append(candidates[np.argsort(-scores, kind="stable")[:top_k]])
+        return indices
+
+    def _encode_queries(self, keys: List[str]) -> np.ndarray:
+        """
+        Embed normalized queries, encoding only those not already cached.
+        """
+        embeddings: List[np.ndarray | None] = [self.embedding_cache.get(key) for key in keys]
+        missing = [key for key, emb in zip(keys, embeddings) if emb is None]
+        if missing:
+            encoded = np.asarray(self._get_model().encode(missing), dtype="float32")
+            fresh = dict(zip(missing, encoded))
+            for key, emb in fresh.items():
+                self.embedding_cache.set(key, emb)
+            embeddings = [emb if emb is not None else fresh[key] for key, emb in zip(keys, embeddings)]
+        return np.stack(embeddings)
+
+    def embed(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Embed short texts with the index's model, sharing the query cache.
+        """
+        return self._encode_queries([normalize_text(t) for t in texts])
+
+    def evaluate(
+        self,
+        top_k: int = 10,
+        n_queries: int = 200,
+        queries: Sequence[str] | None = None,
+        sweep: Sequence[Dict[str, Any]] | None = None,
+        seed: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        Recall-vs-latency of the built index against exact search over the same chunks.
+
+        Queries default to a sample of the indexed chunk vectors. ``sweep``
+        lists search-parameter settings to try (default: the configured
+        ones); the configured settings are restored afterwards.
+        """
+        if self.index is None:
             return []
+        batches = self._embedded_batches(self._documents(self._document_keys()))
+        base = np.concatenate([self._prepare_vectors(np.array(emb, dtype="float32")) for _, emb in batches])
+        if queries:
+            q_emb = self._prepare_vectors(self._encode_queries([normalize_text(q) for q in queries]))
+        else:
+            rng = np.random.default_rng(seed)
+            q_emb = base[rng.choice(len(base), size=min(n_queries, len(base)), replace=False)]
+
+        try:
+            return evaluate_index(self.index, base, q_emb, min(top_k, len(base)), sweep or [{}])
+        finally:
+            set_search_params(self.index, self.index_params)
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "embeddings": self.embedding_cache.stats(),
+            "results": self.result_cache.stats(),
+        }
+
 
-        q_emb = self.model.encode([query])
-        distances, indices = self.index.search(q_emb, top_k)
+def _slug(name: str) -> str:
+    return "".join(c if c.isalnum() or c in "-_." else "_" for c in name)
+
+
+def _read_index(path: Path):
+    """
+    Memory-map a saved index, or read it into memory for types that cannot be mapped.
+    """
+    try:
+        return faiss.read_index(str(path), faiss.IO_FLAG_MMAP)
+    except RuntimeError:
+        return faiss.read_index(str(path))
 
-        results: List[str] = []
-        for i in indices[0]:
-            if 0 <= i < len(self.chunks):
-                results.append(self.chunks[i])
 
-        return results
+def _atomic_write(path: Path, write) -> None:
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with tmp_path.open("wb") as f:
+        write(f)
+    os.replace(tmp_path, path)
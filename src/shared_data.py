@@ -0,0 +1,308 @@
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import shutil
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from .config import load_config
+from .data_loader import (
+    CUSTOMER_TABLES,
+    CustomerIndex,
+    _column_reader,
+    _group_by_customer,
+    _row_indices,
+    load_all_data,
+)
+
+try:
+    import pyarrow as pa
+except ImportError:  # shared data needs pyarrow; attach() raises without it
+    pa = None
+
+try:
+    import fcntl
+except ImportError:  # no flock (e.g. Windows): concurrent publishers are not serialized
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# Bump when the published layout changes so existing generations are rebuilt.
+_LAYOUT_VERSION = 1
+
+_CURRENT = "CURRENT"
+
+
+# --------------------------------------------------------------
+# PUBLISHING (one process builds, the others wait and attach)
+# --------------------------------------------------------------
+def shared_dir(cfg: Dict[str, Any]) -> Path:
+    return Path(cfg.get("shared_data", {}).get("dir", "data/.shared"))
+
+
+@contextmanager
+def publish_lock(directory: Path, name: str = ".lock") -> Iterator[None]:
+    """
+    Exclusive, cross-process lock on ``directory``/``name`` (blocks until acquired).
+
+    Data publishing uses the default name; other one-builder jobs (the RAG
+    index) pass their own so they do not hold up data attaches.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    with open(directory / name, "w") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def current_generation(directory: Path) -> int | None:
+    """
+    Generation number in ``directory``/CURRENT, or None if nothing is published.
+    """
+    try:
+        return int((directory / _CURRENT).read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def _source_fingerprint(cfg: Dict[str, Any]) -> Dict[str, Any]:
+    data_cfg = cfg["data"]
+    sources = {}
+    for name in CUSTOMER_TABLES + ("stores",):
+        path = Path(data_cfg[name])
+        stat = path.stat()
+        sources[name] = [str(path.resolve()), stat.st_size, stat.st_mtime_ns]
+    return {"layout": _LAYOUT_VERSION, "sources": sources}
+
+
+def _read_manifest(path: Path) -> Dict[str, Any] | None:
+    try:
+        return json.loads((path / "manifest.json").read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return None
+
+
+def _write_table(df: pd.DataFrame, path: Path) -> None:
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    with pa.OSFile(str(path), "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+
+
+def _write_generation(cfg: Dict[str, Any], directory: Path, generation: int, source: Dict[str, Any]) -> Path:
+    started = time.perf_counter()
+    customers, orders, stores, coupons = load_all_data(cfg)
+
+    customers = customers.dropna(subset=["customer_id"]).drop_duplicates("customer_id")
+    orders = orders.dropna(subset=["customer_id"])
+    coupons = coupons.dropna(subset=["customer_id"])
+    if "created_at" in orders.columns:
+        # Newest first within each customer, as CustomerIndex.get_recent_orders returns them.
+        orders = orders.sort_values("created_at", ascending=False, kind="mergesort")
+
+    ids = pd.concat([customers["customer_id"], orders["customer_id"], coupons["customer_id"]]).astype(str)
+    keys = pd.Index(np.sort(ids.unique()))
+
+    tmp_path = directory / f"gen-{generation}.{os.getpid()}.tmp"
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+
+    offsets = []
+    for name, df in zip(CUSTOMER_TABLES, (customers, orders, coupons)):
+        grouped, table_offsets = _group_by_customer(df, keys)
+        _write_table(grouped, tmp_path / f"{name}.arrow")
+        offsets.append(table_offsets)
+    _write_table(stores.reset_index(drop=True), tmp_path / "stores.arrow")
+
+    # Fixed-width UTF-8 keys sort like the strings, so lookups are a binary search.
+    np.save(tmp_path / "keys.npy", np.char.encode(keys.to_numpy(dtype=str), "utf-8"))
+    np.save(tmp_path / "offsets.npy", np.stack(offsets))
+
+    manifest = {
+        "generation": generation,
+        "source": source,
+        "rows": {"customers": len(customers), "orders": len(orders), "coupons": len(coupons), "stores": len(stores)},
+        "keys": len(keys),
+        "published_at": time.time(),
+    }
+    (tmp_path / "manifest.json").write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+
+    path = directory / f"gen-{generation}"
+    shutil.rmtree(path, ignore_errors=True)
+    os.replace(tmp_path, path)
+    logger.info(
+        "Published shared data generation %d in %.2fs: %s", generation, time.perf_counter() - started, manifest["rows"]
+    )
+    return path
+
+
+def _prune(directory: Path, generation: int, keep: int) -> None:
+    """
+    Delete generations older than the newest ``keep``. Workers still mapping
+    them keep their pages until they re-attach; the files are only unlinked.
+    """
+    for path in directory.glob("gen-*"):
+        suffix = path.name[len("gen-"):]
+        if suffix.isdigit() and int(suffix) <= generation - keep:
+            shutil.rmtree(path, ignore_errors=True)
+
+
+def publish(cfg: Dict[str, Any], force: bool = False) -> int:
+    """
+    Publish the configured tables as a new generation, unless the current
+    one was built from the same source files. Returns the current generation.
+
+    Safe to call from every worker at startup: the first one builds while
+    the others wait on the lock, then find the generation up to date.
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for shared_data")
+    directory = shared_dir(cfg)
+    source = _source_fingerprint(cfg)
+
+    with publish_lock(directory):
+        current = current_generation(directory)
+        if current is not None and not force:
+            manifest = _read_manifest(directory / f"gen-{current}")
+            if manifest is not None and manifest.get("source") == source:
+                return current
+
+        generation = (current or 0) + 1
+        _write_generation(cfg, directory, generation, source)
+        tmp_current = directory / f"{_CURRENT}.{os.getpid()}.tmp"
+        tmp_current.write_text(f"{generation}\n")
+        os.replace(tmp_current, directory / _CURRENT)
+        _prune(directory, generation, max(1, cfg.get("shared_data", {}).get("keep_generations", 2)))
+    return generation
+
+
+# --------------------------------------------------------------
+# ATTACHING (workers, read-only)
+# --------------------------------------------------------------
+def _map_table(path: Path) -> "pa.Table":
+    # The table references the mapped buffers, which stay valid after the file is unlinked.
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
+
+class SharedStore:
+    """
+    One published generation, memory-mapped read-only.
+
+    The Arrow tables and the key/offset arrays are backed by the mapped
+    files, so every worker attached to the same generation shares a single
+    copy in the OS page cache instead of holding its own DataFrames.
+    """
+
+    def __init__(self, path: Path) -> None:
+        manifest = _read_manifest(path)
+        if manifest is None:
+            raise RuntimeError(f"No shared data generation at {path}")
+        self.path = path
+        self.generation: int = manifest["generation"]
+        self.manifest = manifest
+        self.keys = np.load(path / "keys.npy", mmap_mode="r")
+        self.offsets = np.load(path / "offsets.npy", mmap_mode="r")
+        self.tables = {name: _map_table(path / f"{name}.arrow") for name in CUSTOMER_TABLES + ("stores",)}
+        self._readers = {
+            name: [
+                (column, _column_reader(self.tables[name].column(column).combine_chunks()))
+                for column in self.tables[name].column_names
+            ]
+            for name in CUSTOMER_TABLES
+        }
+
+    def position(self, user_id: str) -> int | None:
+        """
+        Row of ``user_id`` in the key array, or None if unknown.
+        """
+        key = str(user_id).encode("utf-8")
+        if len(key) > self.keys.dtype.itemsize:  # would be truncated by the comparison
+            return None
+        i = int(np.searchsorted(self.keys, key))
+        if i < len(self.keys) and self.keys[i] == key:
+            return i
+        return None
+
+    def rows(self, table: str, position: int, limit: int | None = None) -> List[Dict[str, Any]]:
+        """
+        A customer's rows from ``table`` as dicts, with timestamps as pd.Timestamp like the DataFrame path.
+        """
+        t = CUSTOMER_TABLES.index(table)
+        start, end = int(self.offsets[t, position]), int(self.offsets[t, position + 1])
+        if limit is not None:
+            end = min(end, start + limit)
+        readers = self._readers[table]
+        return [{column: read(i) for column, read in readers} for i in range(start, end)]
+
+    def take(self, table: str, user_ids: List[str]) -> pd.DataFrame:
+        """
+        All rows of the given customers from ``table``, as a DataFrame.
+        """
+        positions = [self.position(user_id) for user_id in user_ids]
+        indices = _row_indices(self.offsets[CUSTOMER_TABLES.index(table)], positions)
+        return self.tables[table].take(indices).to_pandas()
+
+    def frame(self, table: str) -> pd.DataFrame:
+        return self.tables[table].to_pandas()
+
+
+def attach(cfg: Dict[str, Any]) -> SharedStore:
+    """
+    Attach to the current generation, publishing it first if
+    shared_data.publish_on_start is set (the default).
+    """
+    if pa is None:
+        raise RuntimeError("pyarrow is required for shared_data")
+    directory = shared_dir(cfg)
+    if cfg.get("shared_data", {}).get("publish_on_start", True):
+        generation = publish(cfg)
+    else:
+        generation = current_generation(directory)
+        if generation is None:
+            raise RuntimeError(f"No shared data published in {directory}; run python -m src.shared_data")
+    return SharedStore(directory / f"gen-{generation}")
+
+
+class SharedCustomerIndex(CustomerIndex):
+    """
+    CustomerIndex over a SharedStore.
+
+    Lookups binary-search the shared key array and decode only that
+    customer's rows. Ingested rows go through the inherited apply_delta
+    into small per-worker overlay stores, which take precedence over the
+    shared rows.
+    """
+
+    def __init__(self, store: SharedStore, generation: int = 0) -> None:
+        self.store = store
+        self.generation = generation
+        self.base_generation = generation
+        self.modified: Dict[str, int] = {}
+        self.overlay = {name: {} for name in CUSTOMER_TABLES}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Publish the configured tables for workers to attach to.")
+    parser.add_argument("--config", default=os.environ.get("PULSECX_CONFIG", "config.yaml"))
+    parser.add_argument("--force", action="store_true", help="publish even if the source files are unchanged")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    cfg = load_config(args.config)
+    generation = publish(cfg, force=args.force)
+    print(f"Shared data generation {generation} in {shared_dir(cfg)}")
+
+
+if __name__ == "__main__":
+    main()
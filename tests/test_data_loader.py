@@ -0,0 +1,74 @@
+import pandas as pd
+import pytest
+
+from src.data_loader import CustomerIndex, rows_to_frame
+
+
+def test_offset_timestamps_become_naive_utc():
+    df = rows_to_frame("coupons", [
+        {"coupon_id": "c1", "customer_id": "u1", "expiry_date": "2031-01-01T10:00:00+05:30"},
+        {"coupon_id": "c2", "customer_id": "u1", "expiry_date": "2031-01-02"},
+        {"coupon_id": "c3", "customer_id": "u1", "expiry_date": None},
+    ])
+    assert df["expiry_date"].dt.tz is None
+    assert df["expiry_date"].iloc[0] == pd.Timestamp("2031-01-01 04:30:00")
+    assert pd.isna(df["expiry_date"].iloc[2])
+
+
+def test_unparseable_or_keyless_rows_are_rejected():
+    with pytest.raises(ValueError):
+        rows_to_frame("orders", [{"order_id": "o1", "customer_id": "u1", "created_at": "not a date"}])
+    with pytest.raises(ValueError):
+        rows_to_frame("orders", [{"order_id": "o1", "created_at": "2031-01-01 10:00:00"}])
+
+
+def _index() -> CustomerIndex:
+    customers = pd.DataFrame({"customer_id": ["u1", "u2"], "name": ["Priya", "Arjun"]})
+    orders = rows_to_frame("orders", [
+        {"order_id": "o1", "customer_id": "u1", "item": "Latte", "created_at": "2031-01-01 09:00:00"},
+        {"order_id": "o2", "customer_id": "u1", "item": "Mocha", "created_at": "2031-01-03 09:00:00"},
+        {"order_id": "o3", "customer_id": "u2", "item": "Tea", "created_at": "2031-01-02 09:00:00"},
+    ])
+    coupons = rows_to_frame("coupons", [
+        {"coupon_id": "c1", "customer_id": "u1", "expiry_date": "2999-01-01"},
+        {"coupon_id": "c2", "customer_id": "u1", "expiry_date": "2000-01-01"},
+    ])
+    return CustomerIndex(customers, orders, coupons)
+
+
+def test_index_lookups():
+    index = _index()
+    assert index.get_customer("u1") == {"customer_id": "u1", "name": "Priya"}
+    assert index.get_customer("nobody") is None
+    assert [o["order_id"] for o in index.get_recent_orders("u1")] == ["o2", "o1"]
+    assert [c["coupon_id"] for c in index.get_active_coupons("u1")] == ["c1"]
+    assert index.get_recent_orders("u2")[0]["created_at"] == pd.Timestamp("2031-01-02 09:00:00")
+
+
+def test_apply_delta_upserts_into_a_new_index():
+    index = _index()
+    new = index.apply_delta(
+        customers=rows_to_frame("customers", [{"customer_id": "u3", "name": "Meera"}]),
+        orders=rows_to_frame("orders", [
+            {"order_id": "o1", "customer_id": "u1", "item": "Flat White", "created_at": "2031-01-04 09:00:00"},
+            {"order_id": "o4", "customer_id": "u1", "item": "Tea", "created_at": "2031-01-02 09:00:00"},
+        ]),
+        coupons=rows_to_frame("coupons", [{"coupon_id": "c3", "customer_id": "u1", "expiry_date": None}]),
+    )
+
+    assert new.get_customer("u3")["name"] == "Meera"
+    assert [(o["order_id"], o["item"]) for o in new.get_recent_orders("u1", 5)] == [
+        ("o1", "Flat White"), ("o2", "Mocha"), ("o4", "Tea"),
+    ]
+    assert [c["coupon_id"] for c in new.get_active_coupons("u1")] == ["c1", "c3"]
+    assert new.get_recent_orders("u2")[0]["order_id"] == "o3"
+
+    # The old index is untouched, and only the delta's customers are marked changed.
+    assert [o["order_id"] for o in index.get_recent_orders("u1", 5)] == ["o2", "o1"]
+    assert not new.is_current("u1", index.generation)
+    assert new.is_current("u2", index.generation)
+
+    again = new.apply_delta(orders=rows_to_frame("orders", [
+        {"order_id": "o2", "customer_id": "u1", "item": "Mocha", "created_at": "2031-01-03 09:00:00"},
+    ]))
+    assert [o["order_id"] for o in again.get_recent_orders("u1", 5)] == ["o1", "o2", "o4"]
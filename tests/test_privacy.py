@@ -0,0 +1,42 @@
+import pytest
+
+from src.privacy import PrivacyMasker, get_masker
+
+
+@pytest.mark.parametrize(
+    "text, expected",
+    [
+        ("ping 555-123-4567@office", "ping ***-***-4567@office"),
+        ("Call me 9876543210@ 6pm", "Call me ***-***-3210@ 6pm"),
+        ("555.123.4567@home", "***-***-4567@home"),
+        ("call 555 123 4567 now", "call ***-***-4567 now"),
+    ],
+)
+def test_phone_followed_by_at_is_masked(text, expected):
+    assert get_masker().mask_text(text) == expected
+
+
+def test_digit_local_part_is_masked_as_email():
+    assert get_masker().mask_text("mail 9876543210@gmail.com") == "mail 9***0@gmail.com"
+
+
+def test_phone_inside_email_domain_is_masked():
+    masked = get_masker().mask_text("write to ab@555-123-4567.io")
+    assert "555-123" not in masked
+    assert masked == "write to **@***-***-4567.io"
+
+
+def test_coordinates_are_coarsened():
+    assert get_masker().mask_text("at 12.971623, 77.594612 ok") == "at 12.97, 77.59 ok"
+
+
+def test_flags_disable_branches():
+    masker = PrivacyMasker({"mask_phone": False, "mask_exact_address": False})
+    text = "call 555-123-4567 or john.doe@example.com at 12.971623, 77.594612"
+    assert masker.mask_text(text) == "call 555-123-4567 or j***e@example.com at 12.971623, 77.594612"
+
+
+def test_mask_many_matches_mask_text():
+    masker = get_masker()
+    texts = ["no pii here", "ping 555-123-4567@office", "a.b@ex.com", ""]
+    assert masker.mask_many(texts) == [masker.mask_text(t) for t in texts]
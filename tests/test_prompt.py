@@ -0,0 +1,45 @@
+import pandas as pd
+
+from src.llm_orchestrator import build_prompt, render_cache_context, render_customer_context
+
+
+def test_missing_dates_are_left_out():
+    coupons = [
+        {"coupon_id": "c1", "discount_percent": 10, "store_id": "store_001", "expiry_date": pd.NaT},
+        {"coupon_id": "c2", "discount_percent": 15, "store_id": "store_002", "expiry_date": None},
+        {"coupon_id": "c3", "discount_percent": 20, "store_id": "store_003",
+         "expiry_date": pd.Timestamp("2031-01-01 10:00:00")},
+    ]
+    orders = [{"item": "Latte", "quantity": 1, "status": "placed", "created_at": pd.NaT}]
+
+    rendered = render_customer_context({"name": "Priya", "city": "Pune"}, orders, coupons)
+
+    assert "NaT" not in rendered and "None" not in rendered
+    assert "discount_percent=10, store_id=store_001" in rendered
+    assert "expiry_date=2031-01-01" in rendered
+
+
+def test_build_prompt_with_missing_fields():
+    context = {
+        "customer": {"name": "Priya", "city": None, "loyalty_tier": "Gold"},
+        "recent_orders": [],
+        "coupons": [{"discount_percent": 10, "store_id": "store_001", "expiry_date": pd.NaT}],
+        "store": {"name": "Pune Coffee #1", "city": "Pune", "distance_m": float("nan")},
+    }
+    prompt = build_prompt(context, "any coupons?", [])
+    assert "discount_percent=10" in prompt
+    assert "distance_m" not in prompt
+
+
+def test_cache_context_ignores_exact_distance():
+    fragment = render_customer_context({"name": "Priya"}, [], [{"coupon_id": "c1", "discount_percent": 10}])
+    store = {"store_id": "store_001", "name": "Pune Coffee #1", "distance_m": 1210.37, "lat": 18.52}
+
+    key = render_cache_context(fragment, store)
+    assert render_cache_context(fragment, {**store, "distance_m": 1240.9, "lat": 18.5201}) == key
+    assert render_cache_context(fragment, {**store, "distance_m": 1900.0}) != key
+    assert render_cache_context(fragment, {**store, "store_id": "store_002"}) != key
+
+    other = render_customer_context({"name": "Priya"}, [], [{"coupon_id": "c2", "discount_percent": 20}])
+    assert render_cache_context(other, store) != key
+    assert render_cache_context(fragment, None) != key